@@ -1,6 +1,26 @@
 """Main entry point of library"""
 # flake8: noqa
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
 from .protocol import DecodeMatch, RemoteCommand, SignalData
-from .registry import ProtocolRegistry
+
+if TYPE_CHECKING:
+    from .registry import ProtocolRegistry
+    from .stream import StreamDecoder
 
 __version__ = "0.0.7"
+
+
+def __getattr__(name: str) -> Any:
+    # the registry (and its dependencies) is only imported when first used
+    if name == "ProtocolRegistry":
+        from .registry import ProtocolRegistry
+
+        return ProtocolRegistry
+    if name == "StreamDecoder":
+        from .stream import StreamDecoder
+
+        return StreamDecoder
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,13 +5,16 @@ from __future__ import annotations
 import argparse
 import logging as log
 import sys
-
-import voluptuous as vol  # type: ignore
+from typing import TYPE_CHECKING
 
 from remoteprotocols import __version__
 from remoteprotocols.protocol import ProtocolDef
-from remoteprotocols.registry import ProtocolRegistry
-from remoteprotocols.validators import BITS_VALUES
+
+if TYPE_CHECKING:
+    from remoteprotocols.registry import ProtocolRegistry
+
+# Heavy modules (registry, voluptuous, yaml) are imported only by the commands that need
+# them, to keep startup fast.
 
 CMD_VALIDATE_PROTOCOL = "validate-protocol"
 CMD_VALIDATE_COMMAND = "validate-command"
@@ -19,11 +22,17 @@ CMD_ENCODE = "encode"
 CMD_LIST = "list"
 CMD_CONVERT = "convert"
 
-REGISTRY = ProtocolRegistry()
-
 PROGRAM_NAME = "remoteprotocols"
 
 
+def get_registry(load_builtin: bool = True, lazy: bool = False) -> ProtocolRegistry:
+    """Create the registry with only what the command needs."""
+
+    from remoteprotocols.registry import ProtocolRegistry
+
+    return ProtocolRegistry(load_builtin, lazy)
+
+
 def parse_args(argv: list[str]) -> argparse.Namespace:
     """Convert command line arguments in an object."""
 
@@ -79,6 +88,12 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
         help="Only convert to specified protocols, if applicable.",
         nargs="+",
     )
+    parser_config.add_argument(
+        "-b",
+        "--best",
+        help="Only show the best match into an encoded protocol (or a raw format in --protocols).",
+        action="store_true",
+    )
 
     parser_config = subparsers.add_parser(CMD_LIST, help="List supported protocols.")
     parser_config.add_argument(
@@ -103,10 +118,15 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
 def cmd_validate_protocol(files: list[str]) -> int:
     """Run validate-protocol command."""
 
+    import voluptuous as vol  # type: ignore
+
+    # built-in protocols are not needed to validate a file
+    registry = get_registry(load_builtin=False)
+
     for file in files:
 
         try:
-            REGISTRY.load(file)
+            registry.load(file)
 
         except vol.MultipleInvalid as errs:
             log.error("Invalid format in file %s", file)
@@ -127,9 +147,13 @@ def cmd_validate_protocol(files: list[str]) -> int:
 def cmd_validate_command(commands: list[str]) -> int:
     """Run the validate command."""
 
+    import voluptuous as vol  # type: ignore
+
+    registry = get_registry(lazy=True)
+
     try:
         for cmd in commands:
-            REGISTRY.parse_command(cmd)
+            registry.parse_command(cmd)
     except vol.Invalid as err:
         log.error(err)
         return 1
@@ -140,12 +164,15 @@ def cmd_validate_command(commands: list[str]) -> int:
 def cmd_encode(commands: list[str]) -> int:
     """Run the encode command."""
 
+    import voluptuous as vol  # type: ignore
+
+    registry = get_registry(lazy=True)
+
     try:
         for command in commands:
-            cmd = REGISTRY.parse_command(command)
-            signal = cmd.protocol.encode(cmd.args)
+            signal = registry.encode(command, registry.toggles)
 
-            duration = REGISTRY.get_protocol("duration")
+            duration = registry.get_protocol("duration")
             if duration:
 
                 match = duration.decode(signal)
@@ -163,17 +190,27 @@ def cmd_encode(commands: list[str]) -> int:
 
 
 def cmd_convert(
-    commands: list[str], verbose: bool, tolerance: list[str], protocols: list[str]
+    commands: list[str],
+    verbose: bool,
+    tolerance: list[str],
+    protocols: list[str],
+    best: bool = False,
 ) -> int:
     """Run the decode command."""
 
+    import voluptuous as vol  # type: ignore
+
+    registry = get_registry()
+
     if not tolerance:
         tol = 0.20
     else:
         tol = float(tolerance[0])
     try:
         for command in commands:
-            matches = REGISTRY.convert(command, tol, protocols)
+            matches = registry.convert(
+                command, tol, protocols, mode="best" if best else "all"
+            )
             print("Original: ", command)
 
             if matches:
@@ -201,8 +238,19 @@ def cmd_convert(
 def cmd_list(verbose: bool, protocols: list[str], markdown: bool = False) -> int:
     """Run the list command."""
 
+    registry = get_registry(lazy=True)
+
     if len(protocols) == 0:
-        protocols = REGISTRY.list_protocols()
+        protocols = registry.list_protocols()
+
+    if not verbose and not markdown:
+        # signatures are available without building the protocols
+        for name in protocols:
+            if name not in registry.names:
+                print(f"{name} Unknown protocol")
+                break
+            print(registry.get_signature(name))
+        return 0
 
     if markdown:
         if verbose:
@@ -213,7 +261,7 @@ def cmd_list(verbose: bool, protocols: list[str], markdown: bool = False) -> int
             print("| --- | --- | --- | --- |")
 
     for name in protocols:
-        proto = REGISTRY.get_protocol(name)
+        proto = registry.get_protocol(name)
 
         if proto is None:
             if markdown:
@@ -254,6 +302,8 @@ def cmd_list(verbose: bool, protocols: list[str], markdown: bool = False) -> int
 def proto_help_md(proto: ProtocolDef) -> str:
     """Generets help for protocol in Markdown format."""
 
+    from remoteprotocols.validators import BITS_VALUES
+
     signature = proto.get_signature()
     signature = signature.replace("<", "&lt;").replace(">", "&gt;")
     name = proto.name
@@ -312,7 +362,9 @@ def run(argv: list[str]) -> int:
         return cmd_encode(args.commands)
 
     if args.command == CMD_CONVERT:
-        return cmd_convert(args.commands, args.verbose, args.tolerance, args.protocols)
+        return cmd_convert(
+            args.commands, args.verbose, args.tolerance, args.protocols, args.best
+        )
 
     if args.command == CMD_LIST:
         return cmd_list(args.verbose, args.protocols, args.markdown)
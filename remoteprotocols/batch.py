@@ -0,0 +1,115 @@
+"""Decoding of many signals in a pool of worker processes.
+
+Bursts of all signals are packed as signed 32-bit integers in a single shared memory
+block, so tasks only carry (offset, length, frequency) of each signal and workers read
+the bursts without copying. Each worker builds its registry once, from the protocols of
+the calling registry, and matches are sent back by protocol name.
+"""
+
+from __future__ import annotations
+
+from array import array
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Any, Iterable, List, Tuple
+
+from remoteprotocols.protocol import BURSTS_TYPECODE, DecodeMatch, SignalData
+
+if TYPE_CHECKING:
+    from remoteprotocols.registry import ProtocolRegistry
+
+# (protocol name, args, missing bits, unique match, toggle bit, tolerance)
+MatchData = Tuple[str, List[int], List[int], bool, int, float]
+
+# State of a worker process, set by init_worker
+_worker: dict[(str, Any)] = {}  # pylint: disable=invalid-name
+
+
+def pack_signals(
+    signals: Iterable[SignalData],
+) -> tuple[shared_memory.SharedMemory, list[tuple[int, int, int]]]:
+    """Pack the bursts of all signals in a new shared memory block.
+
+    Return the block and (offset, length, frequency) of each signal in it.
+    """
+
+    packed = array(BURSTS_TYPECODE)
+    tasks: list[tuple[int, int, int]] = []
+    for signal in signals:
+        bursts = signal.bursts
+        tasks.append((len(packed), len(bursts), signal.frequency))
+        if isinstance(bursts, array):
+            packed.extend(bursts)
+        else:
+            packed.frombytes(memoryview(bursts).cast("B"))  # type: ignore
+
+    # a block can't be empty
+    block = shared_memory.SharedMemory(create=True, size=max(len(packed), 1) * 4)
+    block.buf[: len(packed) * 4] = packed.tobytes()
+    return (block, tasks)
+
+
+def init_worker(
+    name: str,
+    protocols: dict[(str, Any)],
+    pending: dict[(str, Any)],
+    names: list[str],
+    options: tuple[float, list[str] | None, str],
+) -> None:
+    """Build the registry of a worker process and attach to the shared bursts.
+
+    Protocols are decoded in the order of 'names', as in the calling registry.
+    """
+
+    from remoteprotocols.registry import ProtocolRegistry
+
+    registry = ProtocolRegistry(load_builtin=False)
+    for protocol in protocols.values():
+        registry.add_protocol(protocol)
+    registry.add_pending(pending)
+    registry.names = dict.fromkeys(names)
+
+    block = shared_memory.SharedMemory(name=name)
+    _worker["registry"] = registry
+    _worker["block"] = block
+    _worker["bursts"] = block.buf.cast(BURSTS_TYPECODE)
+    _worker["options"] = options
+
+
+def decode_task(task: tuple[int, int, int]) -> list[MatchData]:
+    """Decode a single signal in a worker process."""
+
+    offset, length, frequency = task
+    tolerance, protocols, engine = _worker["options"]
+
+    signal = SignalData(_worker["bursts"][offset : offset + length], frequency)
+    matches = _worker["registry"].decode(signal, tolerance, protocols, engine)
+
+    return [
+        (
+            match.protocol.name,
+            match.args,
+            match.missing_bits,
+            match.uniquematch,
+            match.toggle_bit,
+            match.tolerance,
+        )
+        for match in matches
+    ]
+
+
+def create_match(registry: ProtocolRegistry, data: MatchData) -> DecodeMatch:
+    """Create a DecodeMatch from the data sent by a worker, with the registry's protocol.
+
+    Protocols still pending in a lazy registry are built when first matched.
+    """
+
+    name, args, missing_bits, uniquematch, toggle_bit, tolerance = data
+
+    match = DecodeMatch()
+    match.protocol = registry.get_protocol(name)  # type: ignore
+    match.args = args
+    match.missing_bits = missing_bits
+    match.uniquematch = uniquematch
+    match.toggle_bit = toggle_bit
+    match.tolerance = tolerance
+    return match
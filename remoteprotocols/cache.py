@@ -0,0 +1,122 @@
+"""Persistent cache of validated protocol definitions.
+
+Loading a protocols yaml file requires parsing it and running the full validation,
+which dominates the startup time. The parsed definitions and validated protocols are
+stored on disk, keyed by a hash of the file content, so a changed file is automatically
+validated again. Lazy registries store each protocol once validated on first use.
+
+The cache directory is `$REMOTEPROTOCOLS_CACHE_DIR`, or `remoteprotocols` in the user's
+cache directory. Set `REMOTEPROTOCOLS_CACHE_DIR` to an empty string to disable it.
+Any problem reading or writing the cache silently falls back to a normal load.
+
+Cached files are unpickled, so they are only used if they and the directory belong to
+the current user and nobody else can write to them. The cache is disabled on platforms
+where ownership can't be checked.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import pathlib
+import pickle
+import stat
+import sys
+from typing import Any
+
+CACHE_DIR_ENV = "REMOTEPROTOCOLS_CACHE_DIR"
+
+
+def get_cache_dir() -> pathlib.Path | None:
+    """Get the cache directory, None if the cache is disabled."""
+
+    path = os.environ.get(CACHE_DIR_ENV)
+    if path is not None:
+        return pathlib.Path(path) if path else None
+
+    base = os.environ.get("XDG_CACHE_HOME")
+    if base:
+        return pathlib.Path(base) / "remoteprotocols"
+    return pathlib.Path.home() / ".cache" / "remoteprotocols"
+
+
+@functools.lru_cache(maxsize=None)
+def code_key() -> str:
+    """Get a hash of the library's source code, that defines the classes stored pickled."""
+
+    digest = hashlib.sha256()
+    for path in sorted(pathlib.Path(__file__).parent.rglob("*.py")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def content_key(content: bytes) -> str:
+    """Get the cache key of a protocols file content.
+
+    It includes the library's code and python version, as objects are stored pickled.
+    """
+
+    from remoteprotocols import __version__
+
+    digest = hashlib.sha256(content)
+    digest.update(f"\0{code_key()}:{__version__}:{sys.version_info[:2]}".encode())
+    return digest.hexdigest()
+
+
+def is_private(path: pathlib.Path) -> bool:
+    """Check if a path belongs to the current user and nobody else can write to it."""
+
+    if not hasattr(os, "getuid"):
+        return False
+
+    info = path.stat()
+    return info.st_uid == os.getuid() and not info.st_mode & (
+        stat.S_IWGRP | stat.S_IWOTH
+    )
+
+
+def load(key: str) -> dict[(str, Any)] | None:
+    """Load the cache entry of a file (definitions and validated protocols), None if not cached."""
+
+    directory = get_cache_dir()
+    if directory is None:
+        return None
+
+    try:
+        path = directory / f"{key}.pickle"
+        if not is_private(directory) or not is_private(path):
+            return None
+        with open(path, "rb") as f_handle:
+            entry = pickle.load(f_handle)
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+    return entry if isinstance(entry, dict) else None
+
+
+def store(key: str, entry: dict[(str, Any)]) -> None:
+    """Store the cache entry of a file (definitions and validated protocols)."""
+
+    directory = get_cache_dir()
+    if directory is None:
+        return
+
+    import tempfile
+
+    try:
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not is_private(directory):
+            return
+
+        # write to a temporary file and rename, so readers never get a partial file
+        f_handle, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(f_handle, "wb") as file:
+                pickle.dump(entry, file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, directory / f"{key}.pickle")
+        except BaseException:
+            os.unlink(temp)
+            raise
+    except Exception:  # pylint: disable=broad-except
+        pass
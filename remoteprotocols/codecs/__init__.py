@@ -2,33 +2,61 @@
 
 from __future__ import annotations
 
-from typing import Any
+import math
+from array import array
+from typing import Any, Callable
 
 import voluptuous as vol  # type: ignore
 
 from remoteprotocols import validators as val
 from remoteprotocols.codecs import decoder, encoder
-from remoteprotocols.protocol import ArgDef, DecodeMatch, ProtocolDef, SignalData
+from remoteprotocols.protocol import (
+    ArgDef,
+    DecodeMatch,
+    ProtocolDef,
+    SignalData,
+    ToggleContext,
+    get_toggle,
+    slots_repr,
+)
+
+# array[int] is only used in postponed annotations
+# pylint: disable=unsubscriptable-object
 
 TOGGLE_ARG = "_toggle"  # special arg can be referenced but not defined
 TOGGLE_DEF = ArgDef({"min": 0, "max": 1, "name": TOGGLE_ARG})
 
 
+def get_arg_validator(arg: ArgDef) -> Any:
+    """Get the validator of the values of an argument, building it on first use."""
+
+    if arg.validator is None:
+        validator = [val.integer, vol.Range(min=arg.min, max=arg.max)]
+        if arg.values:
+            validator.append(vol.In(arg.values))
+        # a schema compiles its validators once, vol.All alone does it on every call
+        arg.validator = vol.Schema(vol.All(*validator))
+
+    return arg.validator
+
+
 class ValueOrArg:
     """Represents data in a rule.
 
     It can be either a constant value or a reference to an argument.
     """
 
-    value: int = 0
-    arg: int = 0
+    __slots__ = ("value", "arg")
+
+    value: int
+    arg: int
 
     def __repr__(self) -> str:
-        return self.__dict__.__str__()
+        return slots_repr(self)
 
     def __init__(self, value: int | None = None) -> None:
-        if value:
-            self.value = value
+        self.value = value if value else 0
+        self.arg = 0
 
     def set_arg(self, arg: int) -> None:
         """Set the arg number to point to."""
@@ -52,22 +80,41 @@ class ValueOrArg:
 class RuleDef:
     """Definition of a single rule whithing a codec pattern."""
 
-    type: int = 0  # -1 conditional | 0 data | >0 timings
-    negate: bool = False
+    __slots__ = (
+        "type",
+        "negate",
+        "data",
+        "action",
+        "operation",
+        "op_arg",
+        "nbits",
+        "consequent",
+        "alternate",
+    )
+
+    type: int  # -1 conditional | 0 data | >0 timings
+    negate: bool
     data: ValueOrArg
-    action: str = ""  # M: MSB | L: LSB || > | = | <
-    operation: str = ""  # >: >> | <: << | + | - | * | / | & | '|'
-    op_arg: int = 0
+    action: str  # M: MSB | L: LSB || > | = | <
+    operation: str  # >: >> | <: << | + | - | * | / | & | '|'
+    op_arg: int
     nbits: ValueOrArg
-    consequent: list[Any] | None = None
-    alternate: list[Any] | None = None
+    consequent: list[RuleDef] | None
+    alternate: list[RuleDef] | None
 
     def __init__(self) -> None:
+        self.type = 0
+        self.negate = False
         self.data = ValueOrArg()
+        self.action = ""
+        self.operation = ""
+        self.op_arg = 0
         self.nbits = ValueOrArg()
+        self.consequent = None
+        self.alternate = None
 
     def __repr__(self) -> str:
-        return self.__dict__.__str__()
+        return slots_repr(self)
 
     def eval_op(self, data: int) -> int:
         """Evaluate the operation of the rule using 'data' as left argument of operator."""
@@ -159,20 +206,26 @@ class PatternDef:
     Including rules and repeat information.
     """
 
-    pre: list[RuleDef]
+    __slots__ = ("pre", "data", "mid", "post", "repeat", "repeat_send")
+
+    pre: list[RuleDef] | None
     data: list[RuleDef]
-    mid: list[RuleDef]
-    post: list[RuleDef]
+    mid: list[RuleDef] | None
+    post: list[RuleDef] | None
 
-    repeat: ValueOrArg
-    repeat_send: ValueOrArg
+    repeat: ValueOrArg | None
+    repeat_send: ValueOrArg | None
 
     def __init__(self, value: dict[(str, Any)]) -> None:
-        for key, data in value.items():
-            setattr(self, key, data)
+        self.pre = value.get("pre")
+        self.data = value["data"]
+        self.mid = value.get("mid")
+        self.post = value.get("post")
+        self.repeat = value.get("repeat")
+        self.repeat_send = value.get("repeat_send")
 
     def __repr__(self) -> str:
-        return self.__dict__.__str__()
+        return slots_repr(self)
 
 
 class TimingsDef:
@@ -228,7 +281,9 @@ class CodecDef(ProtocolDef):
     preset: ValueOrArg
     pattern: PatternDef
 
-    _toggle: int = 0
+    _preset_table: tuple[dict[(tuple[int, ...], list[int])], list[int]] | None = None
+    # Compiled encoder of each preset, built on first encode and not pickled
+    _encoders: dict[(int, Callable[[list[int]], array[int]])] | None = None
 
     def __init__(self, value: dict[(str, Any)], name: str) -> None:
         for key, data in value.items():
@@ -236,6 +291,15 @@ class CodecDef(ProtocolDef):
 
         self.name = name
 
+    def __getstate__(self) -> dict[(str, Any)]:
+        state = self.__dict__.copy()
+        state.pop("_encoders", None)
+        return state
+
+    def get_arg(self, index: int) -> ArgDef:
+        """Get an argument definition by its index in rules, where 0 is the toggle."""
+        return TOGGLE_DEF if index == 0 else self.args[index - 1]
+
     def parse_args(self, args: list[Any]) -> list[int]:
         """Validate argument list and fills missing args with default values."""
         parsed: list[int] = []
@@ -248,10 +312,6 @@ class CodecDef(ProtocolDef):
         for idx, arg in enumerate(self.args):
 
             try:
-                validator = [val.integer, vol.Range(min=arg.min, max=arg.max)]
-                if arg.values:
-                    validator.append(vol.In(arg.values))
-
                 if idx < args_len and args[idx] is not None:
                     value = args[idx]
                 elif arg.default is not None:
@@ -259,7 +319,7 @@ class CodecDef(ProtocolDef):
                 else:
                     vol.Invalid("Missing required argument")
 
-                value = vol.All(*validator)(value)
+                value = get_arg_validator(arg)(value)
                 parsed.append(value)
             except vol.Invalid as err:
                 raise vol.Invalid(f"Arg #{idx} <{arg.name}>: {err.msg}")
@@ -287,10 +347,12 @@ class CodecDef(ProtocolDef):
 
         return command
 
-    def encode(self, args: list[int]) -> SignalData:
-        """Encode protocol arguments into signal duration data."""
-        self._toggle ^= 1
-        args = [self._toggle] + args
+    def encode(self, args: list[int], toggle: int | ToggleContext = 0) -> SignalData:
+        """Encode protocol arguments into signal duration data.
+
+        The toggle bit is given explicitly, or is the next one of a caller's context.
+        """
+        args = [get_toggle(self.name, toggle)] + args
 
         signal = SignalData()
         preset = self.preset.get(args)
@@ -301,9 +363,130 @@ class CodecDef(ProtocolDef):
         timings = self.timings[preset]
 
         signal.frequency = timings.get_frequency(args)
-        signal.bursts = encoder.encode_pattern(self.pattern, args, timings)
+        try:
+            signal.bursts = self.get_encoder(preset)(args)
+        except OverflowError:
+            raise vol.Invalid("Durations must fit in signed 32-bit integers")
         return signal
 
+    def encode_many(self, args_matrix: Any, toggle: int = 0) -> tuple[Any, Any]:
+        """Encode many rows of arguments at once, with NumPy.
+
+        Return a 2-D int32 array of bursts (one row per args row, padded with zeros)
+        and an array with the number of bursts of each row.
+        """
+
+        from remoteprotocols.codecs import vectorized
+
+        if not vectorized.available():
+            raise ImportError("encode_many requires NumPy")
+
+        return vectorized.encode_many(self, args_matrix, toggle)
+
+    def get_encoder(self, preset: int) -> Callable[[list[int]], array[int]]:
+        """Get the compiled encoder of a timing preset, compiled on first use."""
+
+        if self._encoders is None:
+            self._encoders = {}
+
+        compiled = self._encoders.get(preset)
+        if compiled is None:
+            compiled = encoder.compile_pattern(self, self.timings[preset])
+            self._encoders[preset] = compiled
+        return compiled
+
+    def get_leading_slot(self) -> int | None:
+        """Get the index of the timing slot every decoded signal must start with.
+
+        None if the pattern doesn't start with a timing slot.
+        """
+
+        rules = self.pattern.pre
+        if not rules:
+            repeat = self.pattern.repeat
+            if repeat is not None and (repeat.has_arg() or repeat.value < 1):
+                # data could be decoded zero times
+                return None
+            rules = self.pattern.data
+
+        if not rules or rules[0].type <= 0:
+            return None
+
+        return rules[0].type - 1
+
+    def get_leading_bursts(self) -> list[tuple[int, ...]] | None:
+        """Get the leading timing slot of the pattern, resolved for each preset to decode.
+
+        None if the pattern doesn't start with a timing slot.
+        """
+
+        slot = self.get_leading_slot()
+        if slot is None:
+            return None
+
+        if self.preset.has_arg():
+            timings = self.timings
+        else:
+            timings = [self.timings[self.preset.value]]
+
+        leading: list[tuple[int, ...]] = []
+        for preset in timings:
+            # resolved as in decoding, without args
+            bursts = preset.get_slot(slot, None)
+            if not bursts:
+                return None
+            leading.append(tuple(bursts))
+
+        return leading
+
+    def get_preset_table(self) -> tuple[dict[(tuple[int, ...], list[int])], list[int]]:
+        """Get the presets to decode, by their leading bursts.
+
+        Return (leading bursts -> preset indexes, presets always decoded). Custom presets,
+        with durations from args, or patterns without leading slot are always decoded.
+        """
+
+        if self._preset_table is not None:
+            return self._preset_table
+
+        table: dict[(tuple[int, ...], list[int])] = {}
+        always: list[int] = []
+
+        slot = self.get_leading_slot()
+        for preset, timings in enumerate(self.timings):
+            durations: list[ValueOrArg] = []
+            bursts: list[int] = []
+            if slot is not None and slot < len(timings.slots):
+                durations = timings.slots[slot]
+                bursts = timings.get_slot(slot, None)
+
+            if (
+                not bursts
+                or timings.unit.has_arg()
+                or any(duration.has_arg() for duration in durations)
+            ):
+                always.append(preset)
+            else:
+                table.setdefault(tuple(bursts), []).append(preset)
+
+        self._preset_table = (table, always)
+        return self._preset_table
+
+    def get_presets(self, signal: SignalData, tolerance: float) -> list[int]:
+        """Get the timing presets that could decode a signal, in order."""
+
+        if not self.preset.has_arg():
+            return [self.preset.value]
+
+        table, presets = self.get_preset_table()
+        presets = list(presets)
+        for bursts, indexes in table.items():
+            if signal.match_bursts(0, bursts, tolerance):
+                presets += indexes
+
+        presets.sort()
+        return presets
+
     def decode(self, signal: SignalData, tolerance: float = 0.25) -> list[DecodeMatch]:
         """Check a signal against the protocol and if it maches return decoded arguments.
 
@@ -311,24 +494,96 @@ class CodecDef(ProtocolDef):
         If no match the list has zero elements.
         """
 
-        decoded: list[DecodeMatch] = []
+        return self.decode_presets(
+            signal, tolerance, decoder.DemodulationCache(signal)
+        )[0]
 
-        # See if we need to decode a preset, if so try every timing info
-        if self.preset.has_arg():
-            for preset, timings in enumerate(self.timings):
+    def decode_tolerances(
+        self, signal: SignalData, max_tolerance: float = 0.5
+    ) -> list[DecodeMatch]:
+        """Decode a signal at every tolerance up to 'max_tolerance'.
 
-                state = decoder.DecodeState(self, signal, tolerance, timings)
-                result = decoder.decode_pattern(state)
-                if result:
-                    if state.args[self.preset.arg].update(preset, None):
-                        decoded.append(decoder.create_match(state))
+        Each match is decoded at tolerances from its 'tolerance' up to (excluding) its
+        'max_tolerance', with the deviation of each timing slot of the decoding at its
+        lowest tolerance. The signal is decoded again only for tolerances that give
+        different matches, below the highest deviation of the previous decoding.
+        """
+
+        matches: list[DecodeMatch] = []
+        # matches of the previous decoding by (args, missing bits, unique, toggle)
+        previous: dict[(tuple[Any, ...], DecodeMatch)] = {}
+        tolerance = max_tolerance
+        upper = math.inf
+
+        while True:
+            decoded, lowest, _ = self.decode_presets(signal, tolerance, None, True)
+
+            current: dict[(tuple[Any, ...], DecodeMatch)] = {}
+            for match in decoded:
+                key = (
+                    tuple(match.args),
+                    tuple(match.missing_bits),
+                    match.uniquematch,
+                    match.toggle_bit,
+                )
+                found = previous.get(key)
+                if found is None:
+                    found = match
+                    found.max_tolerance = upper
+                    matches.append(found)
+                found.tolerance = lowest
+                found.deviations = match.deviations
+                current[key] = found
+
+            if lowest <= 0:
+                return matches
+
+            # just below the highest deviation, a burst that matched doesn't anymore
+            previous = current
+            upper = lowest
+            tolerance = min(lowest, tolerance) * (1 - decoder.EPSILON)
+
+    def decode_presets(
+        self,
+        signal: SignalData,
+        tolerance: float,
+        cache: decoder.DemodulationCache | None,
+        trace: bool = False,
+    ) -> tuple[list[DecodeMatch], float, bool]:
+        """Decode a signal with every timing preset that could match.
+
+        'cache' shares demodulated data bits with other protocols decoding the same signal.
+        With 'trace', bits are read one by one without cache, and also return the
+        highest deviation of all bursts matched, by any preset. Decoding at any lower
+        tolerance down to it gives the same matches.
+        Also return if no burst past the end of the signal was needed, so any longer
+        signal starting with it gives the same matches.
+        """
+
+        decoded: list[DecodeMatch] = []
+        lowest = 0.0
+        # presets are selected by leading bursts, that may be longer than the signal
+        complete = not self.preset.has_arg() or all(
+            len(bursts) <= len(signal.bursts) for bursts in self.get_preset_table()[0]
+        )
+
+        # Try every timing preset that could match, more than one if preset is an arg
+        for preset in self.get_presets(signal, tolerance):
 
-        else:
             state = decoder.DecodeState(
-                self, signal, tolerance, self.timings[self.preset.value]
+                self, signal, tolerance, self.timings[preset], cache, trace
             )
             result = decoder.decode_pattern(state)
-            if result:
-                decoded.append(decoder.create_match(state))
-
-        return decoded
+            complete = complete and not state.truncated
+            if state.trace:
+                lowest = max(lowest, *state.trace.values())
+            if not result:
+                continue
+            if self.preset.has_arg() and not state.args[self.preset.arg].update(
+                preset, None
+            ):
+                continue
+
+            decoded.append(decoder.create_match(state))
+
+        return (decoded, lowest, complete)
@@ -0,0 +1,347 @@
+"""Combined decoder, matching a signal against all encoded protocols in a single pass.
+
+The linear part of every pattern (timing slots and data bits up to the first conditional
+rule), resolved for each timing preset, is merged into a trie of steps. Protocols and
+presets that share structure, like the sync and bit timings of the rc_switch family,
+share the same nodes, so their bursts are matched only once.
+
+Decoding walks the trie over the signal, following every step that matches. When the
+linear part of a pattern is consumed, the decoded bits are applied to its arguments and
+any remaining rules are decoded by the interpreter, with the same results as decoding
+each protocol separately.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence, Tuple
+
+from remoteprotocols import codecs
+from remoteprotocols.codecs import decoder
+from remoteprotocols.protocol import DecodeMatch, ProtocolDef, SignalData
+
+STEP_SLOT = "slot"  # fixed bursts
+STEP_BIT = "bit"  # single bit, one or zero
+STEP_RUN = "run"  # as many bits as possible, up to a maximum
+
+
+class Entry:
+    """Pattern of a protocol for a single timing preset."""
+
+    protocol: codecs.CodecDef
+    preset: int
+    timings: codecs.TimingsDef
+    data_rules: list[tuple[codecs.RuleDef, int]]  # rule and number of outputs used
+    rest: list[codecs.RuleDef]
+
+    def __init__(
+        self, protocol: codecs.CodecDef, preset: int, timings: codecs.TimingsDef
+    ) -> None:
+        self.protocol = protocol
+        self.preset = preset
+        self.timings = timings
+        self.data_rules = []
+        self.rest = []
+
+    def __repr__(self) -> str:
+        return f"{self.protocol.name}[{self.preset}]"
+
+
+class Node:
+    """Node of the trie, after consuming a sequence of steps."""
+
+    children: dict[(tuple[Any, ...], Node)]
+    entries: list[Entry]
+    names: set[str]  # protocols reachable from this node
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.entries = []
+        self.names = set()
+
+    def __repr__(self) -> str:
+        return self.__dict__.__str__()
+
+
+def flatten_pattern(pattern: codecs.PatternDef) -> list[codecs.RuleDef] | None:
+    """Expand a pattern with a fixed number of repeats into a single list of rules."""
+
+    repeat = 1
+    if pattern.repeat is not None:
+        if pattern.repeat.has_arg() or pattern.repeat.value < 1:
+            return None
+        repeat = pattern.repeat.value
+
+    rules: list[codecs.RuleDef] = list(pattern.pre or [])
+    for _ in range(repeat):
+        rules += pattern.data
+        rules += pattern.mid or []
+    rules += pattern.post or []
+
+    return rules
+
+
+def entry_steps(
+    entry: Entry, rules: list[codecs.RuleDef]
+) -> list[tuple[Any, ...]] | None:
+    """Steps of the linear part of a pattern for a preset. None if it cannot be decoded.
+
+    Data rules are added to the entry, and the rules after the linear part become its rest.
+    """
+
+    one = tuple(entry.timings.get_bit(1, None))
+    zero = tuple(entry.timings.get_bit(0, None))
+    if not one or not zero:
+        return None
+
+    steps: list[tuple[Any, ...]] = []
+    for idx, rule in enumerate(rules):
+        if rule.type < 0:
+            entry.rest = rules[idx:]
+            break
+
+        # Case named timings rule:
+        if rule.type > 0:
+            bursts = tuple(entry.timings.get_slot(rule.type - 1, None))
+            if bursts:
+                steps.append((STEP_SLOT, bursts))
+
+        # Case data rule
+        elif rule.nbits.has_arg():
+            max_bits = entry.protocol.get_arg(rule.nbits.arg).max
+            if max_bits <= 0:
+                return None
+            steps.append((STEP_RUN, one, zero, max_bits))
+            entry.data_rules.append((rule, 1))
+
+        else:
+            if rule.nbits.value <= 0:
+                return None  # cannot be decoded
+            steps += [(STEP_BIT, one, zero)] * rule.nbits.value
+            entry.data_rules.append((rule, rule.nbits.value))
+
+    return steps
+
+
+# Bits of the data steps of a path, linked as (bits of the last step, previous ones)
+Bits = Optional[Tuple[str, Any]]
+# Node reached by a path, with its cursor, used tolerance and bits
+Path = Tuple[Node, int, float, Bits]
+
+
+def path_bits(bits: Bits) -> list[str]:
+    """Get the bits of each data step of a path, in order."""
+
+    outputs: list[str] = []
+    while bits is not None:
+        outputs.append(bits[0])
+        bits = bits[1]
+    outputs.reverse()
+    return outputs
+
+
+class Automaton:
+    """Trie of all encoded protocols, decoded in a single walk over the signal."""
+
+    root: Node
+    protocols: dict[(str, ProtocolDef)]  # protocols included in the trie
+    valid: bool = False
+
+    def __init__(self) -> None:
+        self.root = Node()
+        self.protocols = {}
+
+    def __repr__(self) -> str:
+        return self.__dict__.__str__()
+
+    def invalidate(self) -> None:
+        """Mark the trie to be rebuilt on next use."""
+        self.valid = False
+
+    def build(self, protocols: dict[(str, ProtocolDef)]) -> None:
+        """Build the trie from all encoded protocols that can be flattened."""
+
+        self.root = Node()
+        self.protocols = {}
+
+        for proto in protocols.values():
+            if isinstance(proto, codecs.CodecDef) and self.add(proto):
+                self.protocols[proto.name] = proto
+
+        self.valid = True
+
+    def add(self, protocol: codecs.CodecDef) -> bool:
+        """Add all presets of a protocol to the trie. False if it cannot be added."""
+
+        rules = flatten_pattern(protocol.pattern)
+        if rules is None:
+            return False
+
+        if protocol.preset.has_arg():
+            presets = list(enumerate(protocol.timings))
+        else:
+            presets = [(protocol.preset.value, protocol.timings[protocol.preset.value])]
+
+        entries: list[tuple[Entry, list[tuple[Any, ...]]]] = []
+        for preset, timings in presets:
+            entry = Entry(protocol, preset, timings)
+            steps = entry_steps(entry, rules)
+            if steps is None:
+                return False
+            entries.append((entry, steps))
+
+        for entry, steps in entries:
+            node = self.root
+            node.names.add(protocol.name)
+            for step in steps:
+                node = node.children.setdefault(step, Node())
+                node.names.add(protocol.name)
+            node.entries.append(entry)
+
+        return True
+
+    def decode(
+        self,
+        signal: SignalData,
+        tolerance: float,
+        protocols: list[str] | None = None,
+    ) -> dict[(str, list[DecodeMatch])]:
+        """Decode a signal against all protocols of the trie (or a filtered subset).
+
+        Return the matches of each protocol, in preset order.
+        """
+
+        found = self.walk(signal, tolerance, set(protocols or ()))
+
+        decoded: dict[(str, list[DecodeMatch])] = {name: [] for name in self.protocols}
+        found.sort(key=lambda item: item[0].preset)
+        for entry, match in found:
+            decoded[entry.protocol.name].append(match)
+
+        return decoded
+
+    def walk(
+        self, signal: SignalData, tolerance: float, wanted: set[str]
+    ) -> list[tuple[Entry, DecodeMatch]]:
+        """Follow every path of steps that matches the signal, finishing their entries.
+
+        Only protocols in 'wanted' are decoded, all if empty. Return the matches of each
+        entry, in the order of a depth first walk.
+        """
+
+        found: list[tuple[Entry, DecodeMatch]] = []
+        # paths to follow, as (node, cursor, used tolerance, bits of data steps)
+        stack: list[Path] = [(self.root, 0, 0.0, None)]
+
+        while stack:
+            path = stack.pop()
+            node, cursor, used, bits = path
+            for entry in node.entries:
+                if not wanted or entry.protocol.name in wanted:
+                    match = self.finish(
+                        entry, signal, tolerance, cursor, used, path_bits(bits)
+                    )
+                    if match:
+                        found.append((entry, match))
+
+            paths = self.follow(path, signal.bursts, tolerance, wanted)
+            # children are followed in order, as pushed in reverse
+            stack += reversed(paths)
+
+        return found
+
+    def follow(
+        self,
+        path: Path,
+        bursts: Sequence[int],
+        tolerance: float,
+        wanted: set[str],
+    ) -> list[Path]:
+        """Get the paths to every child of the node of a path whose step matches."""
+
+        node, cursor, used, bits = path
+        paths: list[Path] = []
+        for step, child in node.children.items():
+            if wanted and wanted.isdisjoint(child.names):
+                continue
+
+            result = self.step(bursts, cursor, step, tolerance)
+            if result is None:
+                continue
+
+            if step[0] != STEP_SLOT:
+                paths.append(
+                    (child, result[0], max(used, result[1]), (result[2], bits))
+                )
+            else:
+                paths.append((child, result[0], max(used, result[1]), bits))
+
+        return paths
+
+    @staticmethod
+    def step(
+        bursts: Sequence[int], cursor: int, step: tuple[Any, ...], tolerance: float
+    ) -> tuple[int, float, str] | None:
+        """Match a single step at a position. Return (new cursor, used tolerance, bits) or None."""
+
+        if step[0] == STEP_SLOT:
+            valid, used = decoder.attempt(bursts, cursor, step[1], tolerance)
+            return (cursor + len(step[1]), used, "") if valid else None
+
+        one, zero = step[1], step[2]
+        max_bits = step[3] if step[0] == STEP_RUN else 1
+        bits = ""
+        used = 0
+
+        while len(bits) < max_bits:
+            valid, tol = decoder.attempt(bursts, cursor, one, tolerance)
+            used = max(used, tol)
+            if valid:
+                bits += "1"
+                cursor += len(one)
+                continue
+
+            valid, tol = decoder.attempt(bursts, cursor, zero, tolerance)
+            used = max(used, tol)
+            if not valid:
+                break
+            bits += "0"
+            cursor += len(zero)
+
+        if not bits or (step[0] == STEP_BIT and len(bits) != 1):
+            return None
+
+        return (cursor, used, bits)
+
+    @staticmethod
+    def finish(
+        entry: Entry,
+        signal: SignalData,
+        tolerance: float,
+        cursor: int,
+        used: float,
+        outputs: list[str],
+    ) -> DecodeMatch | None:
+        """Apply the decoded bits of a path to the args of an entry and decode the remaining rules."""
+
+        state = decoder.DecodeState(entry.protocol, signal, tolerance, entry.timings)
+        state.decoded = cursor
+        state.used_tolerance = used
+
+        idx = 0
+        for rule, count in entry.data_rules:
+            bits = "".join(outputs[idx : idx + count])
+            idx += count
+
+            if rule.action == "L":
+                bits = bits[::-1]
+            if not decoder.update_data(state, rule, int(bits, 2), len(bits)):
+                return None
+
+        if not decoder.decode_rules(state, entry.rest):
+            return None
+
+        preset = entry.protocol.preset
+        if preset.has_arg() and not state.args[preset.arg].update(entry.preset, None):
+            return None
+
+        return decoder.create_match(state)
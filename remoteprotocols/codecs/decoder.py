@@ -2,30 +2,263 @@
 
 from __future__ import annotations
 
-import copy
-from typing import Any
+from typing import Any, Callable, Sequence
 
 # pylint: disable=cyclic-import
 from remoteprotocols import codecs
-from remoteprotocols.protocol import ArgDef, DecodeMatch, SignalData
+from remoteprotocols.protocol import ArgDef, DecodeMatch, SignalData, slots_repr
+
+BACKEND_PYTHON = "python"
+BACKEND_NUMPY = "numpy"
+
+# Relative margin for rounding errors between a deviation and the tolerance it needs
+EPSILON = 1e-9
+
+_backend = BACKEND_PYTHON  # pylint: disable=invalid-name
+
+
+def set_backend(backend: str) -> str:
+    """Select the backend to read data bits: 'python' or 'numpy'.
+
+    Falls back to 'python' if NumPy is not installed. Return the backend in use.
+    """
+
+    global _backend  # pylint: disable=global-statement,invalid-name
+
+    if backend not in (BACKEND_PYTHON, BACKEND_NUMPY):
+        raise ValueError(f"Unknown decoding backend '{backend}'")
+
+    if backend == BACKEND_NUMPY:
+        # NumPy is only imported when selected
+        from remoteprotocols.codecs import vectorized
+
+        if not vectorized.available():
+            backend = BACKEND_PYTHON
+
+    _backend = backend
+    return _backend
+
+
+def get_backend() -> str:
+    """Get the backend in use to read data bits."""
+    return _backend
+
+
+def deviation(burst: int, expect: int) -> float:
+    """Get the lowest tolerance for a burst to match the signal's expected one."""
+
+    if burst == expect:
+        return 0.0
+    return abs(burst - expect) / abs(expect)
+
+
+def attempt(
+    bursts: Sequence[int], cursor: int, template: Sequence[int], tolerance: float
+) -> tuple[bool, float]:
+    """Match bursts at a position as DecodeState.expect_burst does.
+
+    Return (valid, used tolerance), including partial matches of an invalid template.
+    """
+
+    if len(template) > len(bursts) - cursor:
+        return (False, 0)
+
+    used: float = 0
+    for idx, burst in enumerate(template):
+        expect = bursts[cursor + idx]
+        tol = tolerance if expect >= 0 else -tolerance
+
+        if not expect * (1 - tol) <= burst <= expect * (1 + tol):
+            return (False, used)
+        used = max(used, abs(burst - expect) / expect)
+
+    return (True, used)
+
+
+class BitRun:
+    """Data bits demodulated from a position, extended on demand until no more bits can be read."""
+
+    __slots__ = (
+        "bursts",
+        "one",
+        "zero",
+        "tolerance",
+        "bits",
+        "positions",
+        "deviations",
+        "ended",
+        "cut",
+    )
+
+    bursts: Sequence[int]
+    one: Sequence[int]
+    zero: Sequence[int]
+    tolerance: float
+
+    bits: list[str]
+    # signal position of each bit, plus the one after the last bit
+    positions: list[int]
+    # tolerance used by each bit, plus by the failed attempt that ended the run
+    deviations: list[float]
+    ended: bool
+    # index of the first attempt with a template past the last burst, None if not reached
+    cut: int | None
+
+    def __init__(
+        self,
+        bursts: Sequence[int],
+        start: int,
+        one: Sequence[int],
+        zero: Sequence[int],
+        tolerance: float,
+    ) -> None:
+        self.bursts = bursts
+        self.one = one
+        self.zero = zero
+        self.tolerance = tolerance
+        self.bits = []
+        self.positions = [start]
+        self.deviations = []
+        self.ended = False
+        self.cut = None
+
+    def __repr__(self) -> str:
+        return slots_repr(self)
+
+    def demodulate(self, count: int) -> None:
+        """Demodulate bits until there are 'count' bits (all if 0) or the run ends."""
+
+        if _backend == BACKEND_NUMPY and not self.ended:
+            from remoteprotocols.codecs import vectorized
+
+            vectorized.extend_run(self, count)
+
+        bursts = self.bursts
+        size = len(bursts)
+        templates = (("1", self.one), ("0", self.zero))
+        cursor = self.positions[-1]
+
+        while not self.ended and (count <= 0 or len(self.bits) < count):
+            # same as attempt() for one, then zero, inlined as this is the hot loop
+            used: float = 0
+            bit = ""
+            for symbol, template in templates:
+                if len(template) > size - cursor:
+                    if self.cut is None:
+                        self.cut = len(self.bits)
+                    continue
+                position = cursor
+                for burst in template:
+                    expect = bursts[position]
+                    tolerance = self.tolerance if expect >= 0 else -self.tolerance
+                    if (
+                        not expect * (1 - tolerance)
+                        <= burst
+                        <= expect * (1 + tolerance)
+                    ):
+                        break
+                    used = max(used, abs(burst - expect) / expect)
+                    position += 1
+                else:
+                    bit = symbol
+                    break
+
+            self.deviations.append(used)
+            if not bit:
+                self.ended = True
+                break
+
+            cursor = position
+            self.bits.append(bit)
+            self.positions.append(cursor)
+
+
+class DemodulationCache:
+    """Data bits of a signal, demodulated once for each distinct bit timings.
+
+    Shared by all protocols (and presets) decoding the same signal. A run of bits is
+    indexed by the position of each of its bits, so reading from the middle of an
+    already demodulated run does not demodulate again.
+    """
+
+    __slots__ = ("signal", "runs")
+
+    signal: SignalData
+    # (one, zero, tolerance) -> position -> (run, bit index)
+    runs: dict[(tuple[Any, ...], dict[(int, tuple[BitRun, int])])]
+
+    def __init__(self, signal: SignalData) -> None:
+        self.signal = signal
+        self.runs = {}
+
+    def __repr__(self) -> str:
+        return slots_repr(self)
+
+    def read(
+        self,
+        one: list[int],
+        zero: list[int],
+        tolerance: float,
+        start: int,
+        max_bits: int,
+    ) -> tuple[str, int, float, bool]:
+        """Read up to 'max_bits' data bits (as many as possible if 0) at a position.
+
+        Return (bits, position after the bits, used tolerance) as DecodeState.read_data,
+        and whether bursts past the end of the signal were needed to read them.
+        """
+
+        positions = self.runs.setdefault((tuple(one), tuple(zero), tolerance), {})
+
+        run, index = positions.get(start) or (
+            BitRun(self.signal.bursts, start, one, zero, tolerance),
+            0,
+        )
+
+        known = len(run.positions)
+        run.demodulate(index + max_bits if max_bits > 0 else 0)
+        for idx in range(known - 1, len(run.positions)):
+            positions.setdefault(run.positions[idx], (run, idx))
+
+        nbits = len(run.bits) - index
+        if 0 < max_bits < nbits:
+            nbits = max_bits
+
+        # tolerance of every attempt, including the one that ended the run
+        tried = nbits if 0 < max_bits == nbits else nbits + 1
+        used = max(run.deviations[index : index + tried], default=0)
+
+        bits = "".join(run.bits[index : index + nbits])
+        return (
+            bits,
+            run.positions[index + nbits],
+            used,
+            run.cut is not None and run.cut < index + tried,
+        )
 
 
 class DecodedArg:
     """Auxiliary class to carry the partial/full decode status of an argument."""
 
-    value: int = 0
-    mask: int = 0
-    decoded_mask: int = 0
+    __slots__ = ("value", "mask", "decoded_mask", "min", "max", "values")
+
+    value: int
+    mask: int
+    decoded_mask: int
     min: int
     max: int
     values: list[int]
 
     def __init__(self, arg: ArgDef) -> None:
+        self.value = 0
+        self.decoded_mask = 0
         self.mask = (1 << arg.max.bit_length()) - 1
         self.max = arg.max
         self.min = arg.min
-        if arg.values:
-            self.values = arg.values
+        self.values = arg.values or []
+
+    def __repr__(self) -> str:
+        return slots_repr(self)
 
     def update(self, value: int, mask: int | None) -> bool:
         """Check consistency of the new value against the already decoded part.
@@ -55,14 +288,37 @@ class DecodedArg:
 class DecodeState:
     """Maintain intermediate decoding state."""
 
+    __slots__ = (
+        "protocol",
+        "signal",
+        "decoded",
+        "tolerance",
+        "used_tolerance",
+        "args",
+        "timings",
+        "journal",
+        "cache",
+        "trace",
+        "truncated",
+    )
+
     protocol: codecs.CodecDef
     signal: SignalData
-    decoded: int = 0
-    tolerance: float = 0.25
-    used_tolerance: float = 0
+    decoded: int
+    tolerance: float
+    used_tolerance: float
 
     args: list[DecodedArg]
     timings: codecs.TimingsDef
+    # (arg index, old value, old decoded mask) of each arg update, to rollback branches
+    journal: list[tuple[int, int, int]]
+    cache: DemodulationCache | None
+    # Highest deviation of the bursts matched by each timing slot and by one/zero bits,
+    # including branches rolled back. Only tracked if not None.
+    trace: dict[(str, float)] | None
+    # Whether bursts past the end of the signal were needed, including branches rolled
+    # back, so a longer signal starting with the same bursts could decode differently
+    truncated: bool
 
     def __init__(
         self,
@@ -70,27 +326,65 @@ class DecodeState:
         signal: SignalData,
         tolerance: float,
         timings: codecs.TimingsDef,
+        cache: DemodulationCache | None = None,
+        trace: bool = False,
     ) -> None:
         self.signal = signal
+        self.cache = cache
+        self.trace = {} if trace else None
         self.tolerance = tolerance
         self.timings = timings
         self.protocol = proto
+        self.decoded = 0
+        self.used_tolerance = 0
+        self.truncated = False
 
         # generate empty decoded args
         empty_args = [DecodedArg(codecs.TOGGLE_DEF)]
         for arg in proto.args:
             empty_args.append(DecodedArg(arg))
         self.args = empty_args
+        self.journal = []
+
+    def update_arg(self, index: int, value: int, mask: int | None) -> bool:
+        """Update a decoded arg, keeping its previous status in the journal."""
 
-    def __deepcopy__(self, memo=None):  # type: ignore
-        dst = copy.copy(self)
-        dst.args = copy.deepcopy(self.args, memo)
-        return dst
+        arg = self.args[index]
+        old_value = arg.value
+        old_mask = arg.decoded_mask
 
-    def update(self, src: Any) -> None:
-        """Update the current state with decoded information from a branching state copying the relevant attributes."""
-        self.decoded = src.decoded
-        self.args = src.args
+        if not arg.update(value, mask):
+            return False
+
+        self.journal.append((index, old_value, old_mask))
+        return True
+
+    def checkpoint(self) -> tuple[int, int, float]:
+        """Get a checkpoint of the current state, to rollback to."""
+        return (len(self.journal), self.decoded, self.used_tolerance)
+
+    def rollback(self, checkpoint: tuple[int, int, float]) -> None:
+        """Restore the state to a previous checkpoint, undoing arg updates done since then."""
+
+        length, self.decoded, self.used_tolerance = checkpoint
+
+        while len(self.journal) > length:
+            index, value, mask = self.journal.pop()
+            self.args[index].value = value
+            self.args[index].decoded_mask = mask
+
+    def record(self, name: str, start: int, bursts: list[int]) -> None:
+        """Keep the deviation of bursts matched at position 'start' in the trace."""
+
+        trace = self.trace
+        if trace is None:
+            return
+
+        signal = self.signal.bursts
+        used = trace.get(name, 0.0)
+        for idx, burst in enumerate(bursts):
+            used = max(used, deviation(burst, signal[start + idx]))
+        trace[name] = used  # pylint: disable=unsupported-assignment-operation
 
     def expect_burst(self, bursts: list[int]) -> bool:
         """Check if the following burst of data coincide with the expected.
@@ -102,11 +396,13 @@ class DecodeState:
         if len(bursts) == 0:
             return True
 
-        if len(bursts) > (len(self.signal.bursts) - self.decoded):
+        signal = self.signal.bursts
+        if len(bursts) > (len(signal) - self.decoded):
+            self.truncated = True
             return False
 
         for burst in bursts:
-            expect = self.signal.bursts[decoded]
+            expect = signal[decoded]
             tolerance = self.tolerance if expect >= 0 else -self.tolerance
 
             if expect * (1 - tolerance) <= burst <= expect * (1 + tolerance):
@@ -128,12 +424,25 @@ class DecodeState:
 
         Return (valid, data, number of bits).
         """
+        if self.cache is not None:
+            result = self.read_cached(expected_bits, lsb)
+            if result is not None:
+                return result
+
+        if _backend == BACKEND_NUMPY and self.trace is None:
+            from remoteprotocols.codecs import vectorized
+
+            result = vectorized.read_data(self, expected_bits, lsb)
+            if result is not None:
+                return result
+
         data = 0
         bit = 0
         nbits = 0
         one = self.timings.get_bit(1, None)
         zero = self.timings.get_bit(0, None)
         while True:
+            start = self.decoded
             if self.expect_burst(one):
                 bit = 1
             elif self.expect_burst(zero):
@@ -141,6 +450,9 @@ class DecodeState:
             else:
                 break
 
+            if self.trace is not None:
+                self.record("one" if bit else "zero", start, one if bit else zero)
+
             if lsb:
                 data |= bit << nbits
             else:
@@ -157,6 +469,40 @@ class DecodeState:
 
         return (True, data, nbits)
 
+    def read_cached(
+        self, expected_bits: codecs.ValueOrArg, lsb: bool
+    ) -> tuple[bool, int, int] | None:
+        """Read data bits from the demodulation cache, same results as read_data.
+
+        None if bits cannot be cached, when one or zero have no bursts.
+        """
+
+        one = self.timings.get_bit(1, None)
+        zero = self.timings.get_bit(0, None)
+        if not one or not zero:
+            return None
+
+        if expected_bits.has_arg():
+            max_bits = self.args[expected_bits.arg].max
+        else:
+            max_bits = expected_bits.value
+
+        bits, self.decoded, used, truncated = self.cache.read(  # type: ignore
+            one, zero, self.tolerance, self.decoded, max_bits
+        )
+        self.used_tolerance = max(self.used_tolerance, used)
+        self.truncated = self.truncated or truncated
+        nbits = len(bits)
+
+        data = 0
+        if nbits:
+            data = int(bits[::-1] if lsb else bits, 2)
+
+        if (not expected_bits.has_arg() and nbits != expected_bits.value) or nbits == 0:
+            return (False, data, nbits)
+
+        return (True, data, nbits)
+
 
 def decode_rule(self: DecodeState, rule: codecs.RuleDef) -> bool:
     """Try to decode a specific rule in the current signal position."""
@@ -167,74 +513,101 @@ def decode_rule(self: DecodeState, rule: codecs.RuleDef) -> bool:
     if rule.type > 0:
 
         burst = self.timings.get_slot(rule.type - 1, None)
-        return self.expect_burst(burst)
+        start = self.decoded
+        if not self.expect_burst(burst):
+            return False
+
+        if self.trace is not None:
+            self.record(self.timings.names[rule.type - 1], start, burst)
+        return True
 
     # Case data rule
     if rule.type == 0:
 
         is_data, data, nbits = self.read_data(rule.nbits, rule.action == "L")
 
-        if not is_data:
+        if not is_data or not update_data(self, rule, data, nbits):
             self.decoded = decoded
             return False
 
-        if rule.nbits.has_arg():
-            # check compatibility and update arg
-            if not self.args[rule.nbits.arg].update(nbits, None):
-                self.decoded = decoded
-                return False
+        return True
 
-        arg, mask = rule.invert_op(data, nbits)
+    # Case conditional rule
+    if rule.type < 0:
+        return decode_conditional(
+            self, rule, decode_rules, rule.consequent, rule.alternate
+        )
 
-        if rule.data.has_arg():
-            tmp_arg = self.args[rule.data.arg]
-        else:
-            tmp_arg = DecodedArg(
-                ArgDef(
-                    {
-                        "min": rule.data.value,
-                        "max": rule.data.value,
-                    }
-                )
-            )
-            tmp_arg.update(rule.data.value, None)
+    return True
 
-        if not tmp_arg.update(arg, mask):
-            self.decoded = decoded
+
+def update_data(
+    state: DecodeState, rule: codecs.RuleDef, data: int, nbits: int
+) -> bool:
+    """Check the bits read for a data rule against the decoded args and update them."""
+
+    if rule.nbits.has_arg():
+        # check compatibility and update arg
+        if not state.update_arg(rule.nbits.arg, nbits, None):
             return False
 
-        return True
+    arg, mask = rule.invert_op(data, nbits)
 
-    # Case conditional rule
-    if rule.type < 0:
+    if rule.data.has_arg():
+        return state.update_arg(rule.data.arg, arg, mask)
 
-        subdecoder = copy.deepcopy(self)
+    # constant data, same check as a fully decoded arg with that value
+    value = rule.data.value
+    return (value & mask) == (arg & ((1 << value.bit_length()) - 1)) and arg <= value
 
-        # Try 'True' branch
 
-        if decode_rules(subdecoder, rule.consequent):  # type:ignore
+def decode_conditional(
+    state: DecodeState,
+    rule: codecs.RuleDef,
+    decode_branch: Callable[[DecodeState, Any], bool],
+    consequent: Any,
+    alternate: Any,
+) -> bool:
+    """Try to decode the branches of a conditional rule, using 'decode_branch' for each one.
 
-            # confirm arg is consistent with condition
-            if confirm_cond(rule, subdecoder.args):
-                self.update(subdecoder)
-            return True
+    Branches are decoded in place and rolled back if not valid. Tolerance used inside
+    branches is not accounted.
+    """
 
-        # Try 'False' branch
-        if rule.alternate:
-            subdecoder = copy.deepcopy(self)
-            if decode_rules(subdecoder, rule.alternate):
+    checkpoint = state.checkpoint()
 
-                # TODO confirm arg is consistent with condition
-                # if not rule.eval_cond(subdecoder.args):
-                self.update(subdecoder)
-                return True
+    # Try 'True' branch
+
+    if decode_branch(state, consequent):
+
+        # confirm arg is consistent with condition
+        if confirm_cond(rule, state):
+            state.used_tolerance = checkpoint[2]
+        else:
+            state.rollback(checkpoint)
+        return True
+
+    state.rollback(checkpoint)
+
+    # Try 'False' branch
+    if alternate:
+        if decode_branch(state, alternate):
+
+            # TODO confirm arg is consistent with condition
+            # if not rule.eval_cond(state.args):
+            state.used_tolerance = checkpoint[2]
+            return True
+
+        state.rollback(checkpoint)
 
     return True
 
 
-def confirm_cond(rule: codecs.RuleDef, args: list[DecodedArg]) -> bool:
+def confirm_cond(rule: codecs.RuleDef, state: DecodeState) -> bool:
     """Check the condition of a rule against a (partially) decoded arg."""
 
+    args = state.args
+
     # Only Case conditional rule
     if rule.type != -1:
         return False
@@ -260,7 +633,7 @@ def confirm_cond(rule: codecs.RuleDef, args: list[DecodedArg]) -> bool:
             data, mask = rule.invert_op(
                 rule.nbits.value, args[rule.data.arg].mask.bit_length()
             )
-            if args[rule.data.arg].update(data, mask):
+            if state.update_arg(rule.data.arg, data, mask):
                 return True
 
         # TODO <, > cases
@@ -279,17 +652,18 @@ def decode_rules(state: DecodeState, rules: list[codecs.RuleDef]) -> bool:
 def decode_pattern(state: DecodeState) -> bool:
     """Decode all the rules in a patter and the number of repeats."""
 
-    decode_repeat = False
+    # arg to decode the number of repeats into, if any
+    repeat_arg: int | None = None
     expected_repeat = 1
     # See if we need to consider a minim repeat
-    if hasattr(state.protocol.pattern, "repeat"):
+    if state.protocol.pattern.repeat is not None:
         if state.protocol.pattern.repeat.has_arg():
-            decode_repeat = True
+            repeat_arg = state.protocol.pattern.repeat.arg
         else:
             expected_repeat = state.protocol.pattern.repeat.value
 
     # pre and post are not included in repeat
-    if hasattr(state.protocol.pattern, "pre"):
+    if state.protocol.pattern.pre is not None:
         result = decode_rules(state, state.protocol.pattern.pre)
         if not result:
             return False
@@ -297,7 +671,7 @@ def decode_pattern(state: DecodeState) -> bool:
     repeat = 0
     while True:
         result = decode_rules(state, state.protocol.pattern.data)
-        if result and hasattr(state.protocol.pattern, "mid"):
+        if result and state.protocol.pattern.mid is not None:
             result = decode_rules(state, state.protocol.pattern.mid)
 
         if not result:
@@ -306,18 +680,16 @@ def decode_pattern(state: DecodeState) -> bool:
                 return False
 
             # end of match, decode number of repeats
-            if decode_repeat:
-                if not state.args[state.protocol.pattern.repeat.arg].update(
-                    repeat, None
-                ):
+            if repeat_arg is not None:
+                if not state.args[repeat_arg].update(repeat, None):
                     return False
                 break
 
         repeat += 1
-        if repeat == expected_repeat and not decode_repeat:
+        if repeat == expected_repeat and repeat_arg is None:
             break
 
-    if hasattr(state.protocol.pattern, "post"):
+    if state.protocol.pattern.post is not None:
         result = decode_rules(state, state.protocol.pattern.post)
         if not result:
             return False
@@ -332,6 +704,9 @@ def create_match(state: DecodeState) -> DecodeMatch:
     match.args = []
     match.missing_bits = []
     match.tolerance = state.used_tolerance
+    if state.trace is not None:
+        match.deviations = dict(state.trace)
+        match.tolerance = max(state.trace.values(), default=0.0)
 
     match.toggle_bit = state.args[0].value
     for arg in state.args[1:]:
@@ -2,8 +2,16 @@
 
 from __future__ import annotations
 
+import operator
+from array import array
+from typing import Callable, List
+
 # pylint: disable=cyclic-import
 from remoteprotocols import codecs
+from remoteprotocols.protocol import BURSTS_TYPECODE
+
+# array[int] is only used in postponed annotations
+# pylint: disable=unsubscriptable-object
 
 
 def encode_rule(
@@ -55,25 +63,243 @@ def encode_rules(
 
 def encode_pattern(
     pattern: codecs.PatternDef, args: list[int], timings: codecs.TimingsDef
-) -> list[int]:
+) -> array[int]:
     """Convert. a pattern into the corresponding signal."""
 
-    result = []
+    result = array(BURSTS_TYPECODE)
 
     repeat = 1
-    if hasattr(pattern, "repeat_send"):
+    if pattern.repeat_send is not None:
         repeat = pattern.repeat_send.get(args)
-    elif hasattr(pattern, "repeat"):
+    elif pattern.repeat is not None:
         repeat = pattern.repeat.get(args)
 
-    if hasattr(pattern, "pre"):
-        result += encode_rules(pattern.pre, args, timings)
-    for _ in range(repeat):
-        result += encode_rules(pattern.data, args, timings)
-        if hasattr(pattern, "mid"):
-            result += encode_rules(pattern.mid, args, timings)
+    if pattern.pre is not None:
+        result.extend(encode_rules(pattern.pre, args, timings))
+
+    # every repetition encodes the same bursts
+    frame = array(BURSTS_TYPECODE, encode_rules(pattern.data, args, timings))
+    if pattern.mid is not None:
+        frame.extend(encode_rules(pattern.mid, args, timings))
+    result.extend(frame * repeat)
 
-    if hasattr(pattern, "post"):
-        result += encode_rules(pattern.post, args, timings)
+    if pattern.post is not None:
+        result.extend(encode_rules(pattern.post, args, timings))
 
     return result
+
+
+# Compiled encoders: the rules of a pattern are turned into a flat list of operations,
+# with constant timings pre-multiplied, that write bursts into a preallocated array.
+
+# Write the bursts of a rule for the args at a position of the array, return the new one
+Operation = Callable[[List[int], "array[int]", int], int]
+
+OPERATORS: dict[(str, Callable[[int, int], int])] = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": lambda data, arg: int(data / arg),
+    ">>": operator.rshift,
+    "<<": operator.lshift,
+    "&": operator.and_,
+    "|": operator.or_,
+    "^": operator.xor,
+}
+
+COMPARISONS: dict[(str, Callable[[int, int], bool])] = {
+    ">": operator.gt,
+    "=": operator.eq,
+    "<": operator.lt,
+}
+
+# Number of bits preallocated for data rules with the number of bits from an arg
+MAX_ARG_BITS = 64
+
+
+def compile_value(value: codecs.ValueOrArg) -> Callable[[list[int]], int]:
+    """Compile a constant or an arg reference into a getter from the args."""
+
+    if value.arg <= 0:
+        constant = value.value
+        return lambda args: constant
+    return operator.itemgetter(value.arg)
+
+
+def compile_data(rule: codecs.RuleDef) -> Callable[[list[int]], int]:
+    """Compile the data of a rule, with its negation and operation."""
+
+    value = compile_value(rule.data)
+    func = OPERATORS.get(rule.operation)
+    op_arg = rule.op_arg
+
+    if rule.negate:
+        data = value
+
+        def negated(args: list[int]) -> int:
+            return ~data(args)  # pylint: disable=invalid-unary-operand-type
+
+        value = negated
+
+    if func is None:
+        return value
+    return lambda args: func(value(args), op_arg)  # type: ignore
+
+
+def compile_durations(
+    durations: list[codecs.ValueOrArg], timings: codecs.TimingsDef
+) -> Callable[[list[int]], array[int]]:
+    """Compile durations into bursts, pre-multiplied by the unit if all are constant."""
+
+    if not timings.unit.has_arg() and not any(d.has_arg() for d in durations):
+        bursts = array(
+            BURSTS_TYPECODE, [d.value * timings.unit.value for d in durations]
+        )
+        return lambda args: bursts
+
+    getters = [compile_value(d) for d in durations]
+    unit = compile_value(timings.unit)
+    return lambda args: array(
+        BURSTS_TYPECODE, [get(args) * unit(args) for get in getters]
+    )
+
+
+def compile_slot(rule: codecs.RuleDef, timings: codecs.TimingsDef) -> Operation:
+    """Compile a named timings rule."""
+
+    index = rule.type - 1
+    durations = timings.slots[index] if index < len(timings.slots) else []
+    bursts = compile_durations(durations, timings)
+    size = len(durations)
+
+    def encode_slot(args: list[int], out: array[int], pos: int) -> int:
+        end = pos + size
+        out[pos:end] = bursts(args)
+        return end
+
+    return encode_slot
+
+
+def compile_bits(rule: codecs.RuleDef, timings: codecs.TimingsDef) -> Operation:
+    """Compile a data rule."""
+
+    data = compile_data(rule)
+    nbits = compile_value(rule.nbits)
+    one = compile_durations(timings.one, timings)
+    zero = compile_durations(timings.zero, timings)
+    msb = rule.action == "M"
+
+    def encode_bits(args: list[int], out: array[int], pos: int) -> int:
+        value = data(args)
+        count = nbits(args)
+        bursts = (zero(args), one(args))
+
+        for i in range(count - 1, -1, -1) if msb else range(count):
+            bit = bursts[value >> i & 1]
+            end = pos + len(bit)
+            # grows the array if the preallocated size is exceeded
+            out[pos:end] = bit
+            pos = end
+
+        return pos
+
+    return encode_bits
+
+
+def compile_conditional(
+    rule: codecs.RuleDef, protocol: codecs.CodecDef, timings: codecs.TimingsDef
+) -> tuple[Operation, int]:
+    """Compile a conditional rule, with the size of its longest branch."""
+
+    data = compile_data(rule)
+    compare = COMPARISONS[rule.action]
+    target = compile_value(rule.nbits)
+    consequent, consequent_size = compile_rules(
+        rule.consequent or [], protocol, timings
+    )
+    alternate, alternate_size = compile_rules(rule.alternate or [], protocol, timings)
+
+    def encode_conditional(args: list[int], out: array[int], pos: int) -> int:
+        branch = consequent if compare(data(args), target(args)) else alternate
+        for operation in branch:
+            pos = operation(args, out, pos)
+        return pos
+
+    return (encode_conditional, max(consequent_size, alternate_size))
+
+
+def compile_rules(
+    rules: list[codecs.RuleDef], protocol: codecs.CodecDef, timings: codecs.TimingsDef
+) -> tuple[list[Operation], int]:
+    """Compile a list of rules into operations, with the number of bursts to preallocate."""
+
+    operations: list[Operation] = []
+    size = 0
+
+    for rule in rules:
+        if rule.type > 0:
+            operations.append(compile_slot(rule, timings))
+            index = rule.type - 1
+            size += len(timings.slots[index]) if index < len(timings.slots) else 0
+        elif rule.type == 0:
+            operations.append(compile_bits(rule, timings))
+            if rule.nbits.has_arg():
+                nbits = min(protocol.get_arg(rule.nbits.arg).max, MAX_ARG_BITS)
+            else:
+                nbits = rule.nbits.value
+            size += nbits * max(len(timings.one), len(timings.zero))
+        elif rule.type == -1:
+            operation, branch_size = compile_conditional(rule, protocol, timings)
+            operations.append(operation)
+            size += branch_size
+
+    return (operations, size)
+
+
+def compile_pattern(
+    protocol: codecs.CodecDef, timings: codecs.TimingsDef
+) -> Callable[[list[int]], array[int]]:
+    """Compile the pattern of a protocol for a timing preset into an encoder from args.
+
+    It gives the same bursts as encode_pattern.
+    """
+
+    pattern = protocol.pattern
+
+    pre, pre_size = compile_rules(pattern.pre or [], protocol, timings)
+    frame, frame_size = compile_rules(
+        pattern.data + (pattern.mid or []), protocol, timings
+    )
+    post, post_size = compile_rules(pattern.post or [], protocol, timings)
+
+    repeat = compile_value(codecs.ValueOrArg(1))
+    if pattern.repeat_send is not None:
+        repeat = compile_value(pattern.repeat_send)
+    elif pattern.repeat is not None:
+        repeat = compile_value(pattern.repeat)
+
+    empty = array(BURSTS_TYPECODE, [0])
+
+    def encode(args: list[int]) -> array[int]:
+        repeats = repeat(args)
+        out = empty * (pre_size + frame_size * max(repeats, 1) + post_size)
+
+        pos = 0
+        for operation in pre:
+            pos = operation(args, out, pos)
+
+        # every repetition encodes the same bursts
+        start = pos
+        for operation in frame:
+            pos = operation(args, out, pos)
+        if repeats != 1:
+            out[start:pos] = out[start:pos] * repeats
+            pos = start + (pos - start) * max(repeats, 0)
+
+        for operation in post:
+            pos = operation(args, out, pos)
+
+        del out[pos:]
+        return out
+
+    return encode
@@ -0,0 +1,218 @@
+"""Static analysis of which encoded protocols can decode signals of other ones.
+
+Built once from the protocol definitions, and used by convert to skip decoding into
+protocols that cannot match the encoded command, and to copy matches between aliases.
+
+Every signal of a protocol starts with one of a few fixed bursts: its leading timing
+slot, or the one/zero bursts of its first data bit, for each timing preset. Decoding a
+signal must match those same leading bursts of the target protocol within tolerance,
+so the minimal tolerance needed between the leading bursts of both protocols is a lower
+bound for any match between them. Protocols whose leading bursts depend on args are
+always tried.
+
+Protocols with identical timings, pattern and args (except for their names) are aliases:
+they decode the same signals into the same args.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Sequence
+
+from remoteprotocols import codecs
+from remoteprotocols.protocol import DecodeMatch, ProtocolDef
+
+# Margin for rounding errors, tolerances closer than this to a bound are not skipped
+EPSILON = 1e-9
+
+
+def leading_rules(
+    pattern: codecs.PatternDef, encoded: bool
+) -> list[codecs.RuleDef] | None:
+    """Get the rules a pattern starts with, None if they depend on the number of repeats."""
+
+    if pattern.pre:
+        return pattern.pre
+
+    repeat = pattern.repeat
+    if encoded and pattern.repeat_send is not None:
+        repeat = pattern.repeat_send
+    if repeat is not None and (repeat.has_arg() or repeat.value < 1):
+        return None
+    return pattern.data
+
+
+def leading_alternatives(
+    protocol: codecs.CodecDef, encoded: bool = False
+) -> list[tuple[int, ...]] | None:
+    """Get the bursts every signal of the protocol to decode starts with.
+
+    With 'encoded', of the signals the protocol encodes, sent 'repeat_send' times if set.
+    One entry per timing preset (and bit value if the pattern starts with data bits).
+    None if unknown, when they depend on args or the pattern can start otherwise.
+    """
+
+    rules = leading_rules(protocol.pattern, encoded)
+    if not rules:
+        return None
+    first = rules[0]
+
+    if protocol.preset.has_arg():
+        presets = protocol.timings
+    elif protocol.preset.value < len(protocol.timings):
+        presets = [protocol.timings[protocol.preset.value]]
+    else:
+        return None
+
+    alternatives: list[tuple[int, ...]] = []
+    for timings in presets:
+        if first.type > 0 and first.type - 1 < len(timings.slots):
+            templates = [timings.slots[first.type - 1]]
+        elif (
+            first.type == 0 and first.action in ("M", "L") and not first.nbits.has_arg()
+        ):
+            if first.nbits.value < 1:
+                return None
+            templates = [timings.one, timings.zero]
+        else:
+            return None
+
+        if timings.unit.has_arg():
+            return None
+
+        for template in templates:
+            if not template or any(duration.has_arg() for duration in template):
+                return None
+            alternatives.append(
+                tuple(duration.value * timings.unit.value for duration in template)
+            )
+
+    return alternatives
+
+
+def needed_tolerance(signal: Sequence[int], expected: Sequence[int]) -> float:
+    """Get the minimal tolerance for the expected bursts to match the start of the signal.
+
+    Only bursts present in both are compared, as in SignalData.match_bursts.
+    """
+
+    needed = 0.0
+    for burst, expect in zip(expected, signal):
+        if burst == expect:
+            continue
+        if expect == 0:
+            return math.inf
+        needed = max(needed, abs(burst - expect) / abs(expect))
+
+    return needed
+
+
+def definition_key(protocol: codecs.CodecDef) -> str:
+    """Get a key of everything in a protocol's definition that affects decoding."""
+
+    args = [
+        (arg.min, arg.max, getattr(arg, "default", None), arg.values)
+        for arg in protocol.args
+    ]
+    return repr((protocol.timings, protocol.preset, protocol.pattern, args))
+
+
+class EquivalenceMap:
+    """Minimal tolerance between every pair of encoded protocols, and aliases."""
+
+    # Minimal tolerance for target (inner key) to decode signals of source (outer key).
+    # Missing pairs may always match.
+    bounds: dict[(str, dict[(str, float)])]
+    # Protocol with the same definition, decoded in its place (only the first is decoded)
+    aliases: dict[(str, str)]
+    valid: bool = False
+
+    def __init__(self) -> None:
+        self.bounds = {}
+        self.aliases = {}
+
+    def __repr__(self) -> str:
+        return self.__dict__.__str__()
+
+    def invalidate(self) -> None:
+        """Mark the map to be rebuilt on next use."""
+        self.valid = False
+
+    def build(self, protocols: dict[(str, ProtocolDef)]) -> None:
+        """Analyze all pairs of encoded protocols."""
+
+        encoded = {
+            name: proto
+            for name, proto in protocols.items()
+            if isinstance(proto, codecs.CodecDef)
+        }
+        sources = {
+            name: leading_alternatives(proto, True) for name, proto in encoded.items()
+        }
+        leading = {name: leading_alternatives(proto) for name, proto in encoded.items()}
+
+        self.bounds = {}
+        for source, signals in sources.items():
+            if signals is None:
+                continue
+            bounds: dict[(str, float)] = {}
+            for target, expected in leading.items():
+                if expected is None or target == source:
+                    continue
+                bounds[target] = min(
+                    needed_tolerance(signal, bursts)
+                    for signal in signals
+                    for bursts in expected
+                )
+            self.bounds[source] = bounds
+
+        self.aliases = {}
+        first: dict[(str, str)] = {}
+        for name, proto in encoded.items():
+            key = definition_key(proto)
+            if key in first:
+                self.aliases[name] = first[key]
+            else:
+                first[key] = name
+
+        self.valid = True
+
+    def can_match(self, source: str, target: str, tolerance: float) -> bool:
+        """Check if the target protocol may decode signals of the source, within tolerance."""
+
+        bound = self.bounds.get(source, {}).get(target)
+        return bound is None or tolerance >= bound - EPSILON
+
+    def candidates(
+        self, source: str, tolerance: float, names: Sequence[str]
+    ) -> list[str]:
+        """Filter the protocols that may decode signals of the source, within tolerance."""
+
+        return [name for name in names if self.can_match(source, name, tolerance)]
+
+    def ambiguities(self, tolerance: float) -> dict[(str, list[str])]:
+        """Get the other encoded protocols that may also decode signals of each one."""
+
+        return {
+            source: [
+                target
+                for target, bound in bounds.items()
+                if tolerance >= bound - EPSILON
+            ]
+            for source, bounds in self.bounds.items()
+        }
+
+
+def copy_match(match: DecodeMatch, protocol: ProtocolDef) -> DecodeMatch:
+    """Copy a match as a match of another protocol (an alias)."""
+
+    copy = DecodeMatch()
+    copy.protocol = protocol
+    copy.args = list(match.args)
+    copy.missing_bits = list(match.missing_bits)
+    copy.uniquematch = match.uniquematch
+    copy.toggle_bit = match.toggle_bit
+    copy.tolerance = match.tolerance
+    copy.max_tolerance = match.max_tolerance
+    copy.deviations = dict(match.deviations)
+    return copy
@@ -0,0 +1,400 @@
+"""Alternative decoder, matching patterns as regular expressions over a burst alphabet.
+
+At load time each pattern is compiled, for every timing preset, into regular expressions
+over the distinct durations used by the preset (its alphabet). To decode, the signal is
+converted once per alphabet into a string of symbols, where each burst is replaced by the
+duration it matches within tolerance, and matching runs inside the `re` engine.
+
+Bits are matched atomically (one before zero, without backtracking) and variable length
+data reads as many bits as possible, to keep the same semantics as the interpreted decoder.
+Conditional rules and argument consistency checks are still evaluated in python,
+between runs of regular rules.
+
+If the tolerance windows of the alphabet overlap, a burst could match more than one
+duration, so that preset falls back to the interpreted decoder.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Union
+
+from remoteprotocols import codecs
+from remoteprotocols.codecs import decoder
+from remoteprotocols.protocol import DecodeMatch, SignalData
+
+SYMBOL_BASE = 0x100  # symbols outside ascii, to never clash with regex syntax
+NO_SYMBOL = "\0"  # burst not matching any duration of the alphabet
+
+
+class Segment:
+    """Run of consecutive non conditional rules, compiled into a single regex."""
+
+    rules: list[codecs.RuleDef]
+    groups: list[str]  # capture group name for each data rule, empty for timings
+    regex: re.Pattern[str]
+
+    def __init__(self) -> None:
+        self.rules = []
+        self.groups = []
+
+    def __repr__(self) -> str:
+        return self.__dict__.__str__()
+
+
+class Conditional:
+    """Conditional rule with compiled branches."""
+
+    rule: codecs.RuleDef
+    consequent: list[Any]
+    alternate: list[Any] | None = None
+
+    def __init__(self, rule: codecs.RuleDef) -> None:
+        self.rule = rule
+
+    def __repr__(self) -> str:
+        return self.__dict__.__str__()
+
+
+Operation = Union[Segment, Conditional]
+
+
+class Program:
+    """Compiled pattern of a protocol for a single timing preset."""
+
+    timings: codecs.TimingsDef
+    alphabet: tuple[int, ...]
+    symbols: dict[(int, str)]
+
+    pre: list[Operation]
+    data: list[Operation]
+    mid: list[Operation]
+    post: list[Operation]
+    repeat: int = 1
+
+    one: list[int]
+    zero: list[int]
+    one_regex: re.Pattern[str]
+    bits_cache: dict[(str, str)]
+
+    def __init__(self, timings: codecs.TimingsDef) -> None:
+        self.timings = timings
+        self.one = timings.get_bit(1, None)
+        self.zero = timings.get_bit(0, None)
+
+        durations = set(self.one + self.zero)
+        for idx in range(len(timings.slots)):
+            durations.update(timings.get_slot(idx, None))
+        self.alphabet = tuple(sorted(durations))
+        self.symbols = {
+            duration: chr(SYMBOL_BASE + idx)
+            for idx, duration in enumerate(self.alphabet)
+        }
+
+        self.one_regex = re.compile(self.to_regex(self.one))
+        self.bits_cache = {}
+
+    def __repr__(self) -> str:
+        return self.__dict__.__str__()
+
+    def to_regex(self, bursts: list[int]) -> str:
+        """Get the regex matching a fixed sequence of bursts."""
+        return "".join(self.symbols[burst] for burst in bursts)
+
+    def overlaps(self, tolerance: float) -> bool:
+        """Check if any burst could match more than one duration of the alphabet."""
+
+        def window(duration: int) -> tuple[float, float]:
+            # range of signal bursts that match the duration within tolerance
+            if duration >= 0:
+                return (duration / (1 + tolerance), duration / (1 - tolerance))
+            return (duration / (1 - tolerance), duration / (1 + tolerance))
+
+        if tolerance >= 1:
+            return len(self.alphabet) > 1
+
+        windows = [window(duration) for duration in self.alphabet]
+        for idx in range(1, len(windows)):
+            if windows[idx][0] <= windows[idx - 1][1]:
+                return True
+
+        return False
+
+    def read_bits(self, text: str, lsb: bool) -> tuple[int, int]:
+        """Convert the symbols of a run of bits into (data, number of bits)."""
+
+        bits = self.bits_cache.get(text)
+        if bits is None:
+            bits = ""
+            pos = 0
+            while pos < len(text):
+                if self.one_regex.match(text, pos):
+                    bits += "1"
+                    pos += len(self.one)
+                else:
+                    bits += "0"
+                    pos += len(self.zero)
+            if len(self.bits_cache) < 4096:
+                self.bits_cache[text] = bits
+
+        if lsb:
+            return (int(bits[::-1], 2), len(bits))
+        return (int(bits, 2), len(bits))
+
+
+def compile_rules(
+    program: Program, protocol: codecs.CodecDef, rules: list[codecs.RuleDef]
+) -> list[Operation]:
+    """Compile a list of rules into regex segments and conditionals."""
+
+    operations: list[Operation] = []
+    segment: Segment | None = None
+    regex = ""
+
+    one = program.to_regex(program.one)
+    zero = program.to_regex(program.zero)
+
+    def close_segment() -> None:
+        if segment is not None:
+            segment.regex = re.compile(regex)
+            operations.append(segment)
+
+    for rule in rules:
+
+        if rule.type < 0:
+            close_segment()
+            segment = None
+            regex = ""
+
+            conditional = Conditional(rule)
+            conditional.consequent = compile_rules(
+                program, protocol, rule.consequent or []
+            )
+            if rule.alternate:
+                conditional.alternate = compile_rules(program, protocol, rule.alternate)
+            operations.append(conditional)
+            continue
+
+        if segment is None:
+            segment = Segment()
+        segment.rules.append(rule)
+
+        # Case named timings rule:
+        if rule.type > 0:
+            segment.groups.append("")
+            regex += program.to_regex(program.timings.get_slot(rule.type - 1, None))
+            continue
+
+        # Case data rule, each bit is atomic: one is tried before zero
+        group = f"d{len(segment.groups)}"
+        segment.groups.append(group)
+        bit = f"(?=(?P<{group}b>{one}|{zero}))(?P={group}b)"
+
+        if not rule.nbits.has_arg():
+            if rule.nbits.value <= 0:
+                regex += "(?!)"  # cannot be decoded
+            else:
+                regex += f"(?P<{group}>(?:{bit}){{{rule.nbits.value}}})"
+        else:
+            max_bits = protocol.get_arg(rule.nbits.arg).max
+            count = f"{{1,{max_bits}}}" if max_bits > 0 else "+"
+            # read as many bits as possible, without backtracking
+            regex += f"(?=(?P<{group}>(?:{bit}){count}))(?P={group})"
+
+    close_segment()
+
+    return operations
+
+
+def compile_codec(protocol: codecs.CodecDef) -> list[Program | None]:
+    """Compile a codec's pattern for each of its timing presets.
+
+    Presets that cannot be expressed as regular expressions are compiled as None.
+    """
+
+    pattern = protocol.pattern
+    if pattern.repeat is not None and (
+        pattern.repeat.has_arg() or pattern.repeat.value < 1
+    ):
+        # a variable number of repeats is decoded by the interpreter
+        return [None] * len(protocol.timings)
+
+    programs: list[Program | None] = []
+    for timings in protocol.timings:
+
+        program = Program(timings)
+        if not program.one or not program.zero:
+            programs.append(None)
+            continue
+
+        program.repeat = pattern.repeat.value if pattern.repeat is not None else 1
+        program.pre = compile_rules(program, protocol, pattern.pre or [])
+        program.data = compile_rules(program, protocol, pattern.data)
+        program.mid = compile_rules(program, protocol, pattern.mid or [])
+        program.post = compile_rules(program, protocol, pattern.post or [])
+        programs.append(program)
+
+    return programs
+
+
+class SymbolCache:
+    """Symbols of a signal for each alphabet, converted only once per decoding."""
+
+    signal: SignalData
+    tolerance: float
+    cache: dict[(tuple[int, ...], tuple[str, list[float]])]
+
+    def __init__(self, signal: SignalData, tolerance: float) -> None:
+        self.signal = signal
+        self.tolerance = tolerance
+        self.cache = {}
+
+    def get(self, alphabet: tuple[int, ...]) -> tuple[str, list[float]]:
+        """Get the symbols string and the deviation of each burst for an alphabet."""
+
+        if alphabet in self.cache:
+            return self.cache[alphabet]
+
+        converted: dict[(int, tuple[str, float])] = {}
+        symbols: list[str] = []
+        deviations: list[float] = []
+
+        for burst in self.signal.bursts:
+            if burst not in converted:
+                converted[burst] = self.convert(alphabet, burst)
+            symbol, deviation = converted[burst]
+            symbols.append(symbol)
+            deviations.append(deviation)
+
+        result = ("".join(symbols), deviations)
+        self.cache[alphabet] = result
+        return result
+
+    def convert(self, alphabet: tuple[int, ...], expect: int) -> tuple[str, float]:
+        """Convert a single burst into (symbol, deviation) as in the interpreted decoder."""
+
+        tolerance = self.tolerance if expect >= 0 else -self.tolerance
+        for idx, burst in enumerate(alphabet):
+            if expect * (1 - tolerance) <= burst <= expect * (1 + tolerance):
+                # negative bursts have negative deviation, ignored by the decoder
+                return (chr(SYMBOL_BASE + idx), max(abs(burst - expect) / expect, 0))
+
+        return (NO_SYMBOL, 0)
+
+
+def run_segment(
+    state: decoder.DecodeState,
+    program: Program,
+    segment: Segment,
+    symbols: tuple[str, list[float]],
+) -> bool:
+    """Match a segment at the current position and update the state from its groups."""
+
+    start = state.decoded
+    match = segment.regex.match(symbols[0], start)
+    if not match:
+        return False
+
+    if match.end() > start:
+        state.used_tolerance = max(
+            state.used_tolerance, max(symbols[1][start : match.end()])
+        )
+
+    for rule, group in zip(segment.rules, segment.groups):
+        if not group:
+            continue
+
+        data, nbits = program.read_bits(match[group], rule.action == "L")
+
+        if rule.nbits.has_arg() and nbits < state.args[rule.nbits.arg].max:
+            # the decoder tries one more bit, that also accounts for tolerance
+            state.decoded = match.end(group)
+            if not state.expect_burst(program.one):
+                state.expect_burst(program.zero)
+
+        if not decoder.update_data(state, rule, data, nbits):
+            state.decoded = start
+            return False
+
+    state.decoded = match.end()
+    return True
+
+
+def run_operations(
+    state: decoder.DecodeState,
+    operations: list[Operation],
+    program: Program,
+    symbols: tuple[str, list[float]],
+) -> bool:
+    """Run a list of compiled operations."""
+
+    def run_branch(substate: decoder.DecodeState, branch: list[Operation]) -> bool:
+        return run_operations(substate, branch, program, symbols)
+
+    for operation in operations:
+        if isinstance(operation, Segment):
+            if not run_segment(state, program, operation, symbols):
+                return False
+        elif not decoder.decode_conditional(
+            state, operation.rule, run_branch, operation.consequent, operation.alternate
+        ):
+            return False
+
+    return True
+
+
+def run_program(
+    state: decoder.DecodeState, program: Program, symbols: tuple[str, list[float]]
+) -> bool:
+    """Decode a full pattern, equivalent to decoder.decode_pattern."""
+
+    if not run_operations(state, program.pre, program, symbols):
+        return False
+
+    for _ in range(program.repeat):
+        if not run_operations(state, program.data, program, symbols):
+            return False
+        if not run_operations(state, program.mid, program, symbols):
+            return False
+
+    return run_operations(state, program.post, program, symbols)
+
+
+def decode(
+    protocol: codecs.CodecDef,
+    programs: list[Program | None],
+    signal: SignalData,
+    tolerance: float,
+    cache: SymbolCache | None = None,
+    demodulated: decoder.DemodulationCache | None = None,
+) -> list[DecodeMatch]:
+    """Decode a signal with the compiled programs of a protocol, equivalent to CodecDef.decode.
+
+    'demodulated' is used by presets that fall back to the interpreted decoder.
+    """
+
+    if cache is None or cache.signal is not signal or cache.tolerance != tolerance:
+        cache = SymbolCache(signal, tolerance)
+
+    decoded: list[DecodeMatch] = []
+
+    for preset in protocol.get_presets(signal, tolerance):
+        timings = protocol.timings[preset]
+        program = programs[preset]
+        state = decoder.DecodeState(protocol, signal, tolerance, timings, demodulated)
+
+        if program is None or program.overlaps(tolerance):
+            result = decoder.decode_pattern(state)
+        else:
+            result = run_program(state, program, cache.get(program.alphabet))
+
+        if not result:
+            continue
+        if protocol.preset.has_arg() and not state.args[protocol.preset.arg].update(
+            preset, None
+        ):
+            continue
+
+        decoded.append(decoder.create_match(state))
+
+    return decoded
@@ -5,7 +5,14 @@ from typing import Any
 
 import voluptuous as vol  # type: ignore
 
-from remoteprotocols.codecs import CodecDef, PatternDef, RuleDef, TimingsDef, ValueOrArg
+from remoteprotocols.codecs import (
+    CodecDef,
+    PatternDef,
+    RuleDef,
+    TimingsDef,
+    ValueOrArg,
+    get_arg_validator,
+)
 from remoteprotocols.protocol import ArgDef
 
 from .pattern import parse_pattern
@@ -24,7 +31,9 @@ def validate_arg_pass2(arg: dict[(str, Any)]) -> ArgDef:
         extra=vol.ALLOW_EXTRA,
     )(arg)
 
-    return ArgDef(arg)
+    arg_def = ArgDef(arg)
+    get_arg_validator(arg_def)
+    return arg_def
 
 
 def validate_protocol_pass2(proto: dict[(str, Any)]) -> dict[(str, Any)]:
@@ -0,0 +1,423 @@
+"""Optional NumPy backend to demodulate a whole run of data bits at once.
+
+All candidate bits of a run are compared against the one/zero templates in a single
+vectorized operation, giving the same results (including used tolerance) as reading
+them one by one, either directly or into the runs of the demodulation cache. Only
+available if NumPy is installed.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import voluptuous as vol  # type: ignore
+
+# pylint: disable=cyclic-import
+from remoteprotocols import codecs
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+
+# Shorter runs are read faster one by one than setting up the arrays
+MIN_BITS = 32
+
+
+def available() -> bool:
+    """Check if NumPy is installed."""
+    return np is not None
+
+
+def match_template(
+    expect: Any, low: Any, high: Any, template: list[int]
+) -> tuple[Any, Any]:
+    """Compare each row of signal bursts against a template.
+
+    Return the valid prefix of each row (as expect_burst stops at the first mismatch)
+    and the deviation of each burst.
+    """
+
+    burst = np.array(template, dtype=np.int64)
+    prefix = np.logical_and.accumulate((low <= burst) & (burst <= high), axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deviation = np.abs(burst - expect) / expect
+
+    return (prefix, deviation)
+
+
+def bounds(
+    bursts: Any, start: int, rows: int, width: int, tolerance: float
+) -> tuple[Any, Any, Any]:
+    """Get the bursts of 'rows' bits at a position, with their tolerance bounds."""
+
+    expect = np.frombuffer(
+        bursts,
+        dtype=np.int32,
+        count=rows * width,
+        offset=start * np.dtype(np.int32).itemsize,
+    )
+    expect = expect.reshape(rows, width).astype(np.int64)
+    signed = np.where(expect >= 0, tolerance, -tolerance)
+    return (expect, expect * (1 - signed), expect * (1 + signed))
+
+
+def demodulate(
+    bursts: Any,
+    start: int,
+    rows: int,
+    templates: tuple[list[int], list[int]],
+    tolerance: float,
+) -> tuple[Any, Any, Any]:
+    """Compare the bursts of 'rows' bits at a position with the (one, zero) templates.
+
+    Return whether each bit is a one, whether it is a valid bit, and the deviation of
+    the bursts expect_burst would have matched to read it.
+    """
+
+    expect, low, high = bounds(bursts, start, rows, len(templates[0]), tolerance)
+
+    prefix1, deviation1 = match_template(expect, low, high, templates[0])
+    prefix0, deviation0 = match_template(expect, low, high, templates[1])
+    is_one = prefix1[:, -1]
+
+    used = np.maximum(
+        np.where(prefix1, deviation1, -np.inf).max(axis=1),
+        np.where(prefix0 & ~is_one[:, None], deviation0, -np.inf).max(axis=1),
+    )
+    return (is_one, is_one | prefix0[:, -1], used)
+
+
+def extend_run(run: Any, count: int) -> None:
+    """Vectorized version of BitRun.demodulate, for the whole bits left in the signal.
+
+    Bits past them, if the run didn't end, are left to be demodulated one by one. Does
+    nothing if one/zero templates have different length, or for too few bits.
+    """
+
+    width = len(run.one)
+    if not width or width != len(run.zero):
+        return
+
+    start = run.positions[-1]
+    rows = (len(run.bursts) - start) // width
+    if count > 0:
+        rows = min(rows, count - len(run.bits))
+    if rows < MIN_BITS:
+        return
+
+    is_one, valid, used = demodulate(
+        run.bursts, start, rows, (run.one, run.zero), run.tolerance
+    )
+
+    invalid = np.flatnonzero(~valid)
+    nbits = int(invalid[0]) if invalid.size else rows
+
+    run.bits += np.where(is_one[:nbits], "1", "0").tolist()
+    run.positions += range(start + width, start + nbits * width + 1, width)
+    # tolerance of every attempt, including the one that ended the run
+    run.deviations += np.maximum(used[: nbits + 1], 0.0).tolist()
+    run.ended = bool(invalid.size)
+
+
+def read_data(
+    state: Any, expected_bits: codecs.ValueOrArg, lsb: bool
+) -> tuple[bool, int, int] | None:
+    """Vectorized version of DecodeState.read_data.
+
+    None if the run cannot be vectorized, when one/zero templates have different length,
+    or if it is too short to be worth it.
+    """
+
+    one = state.timings.get_bit(1, None)
+    zero = state.timings.get_bit(0, None)
+    width = len(one)
+    if not width or width != len(zero):
+        return None
+
+    if expected_bits.has_arg():
+        max_bits = state.args[expected_bits.arg].max
+    else:
+        max_bits = expected_bits.value
+
+    rows = (len(state.signal.bursts) - state.decoded) // width
+    if max_bits > 0:
+        rows = min(rows, max_bits)
+    if rows < MIN_BITS:
+        return None
+
+    is_one, valid, used = demodulate(
+        state.signal.bursts, state.decoded, rows, (one, zero), state.tolerance
+    )
+
+    invalid = np.flatnonzero(~valid)
+    nbits = int(invalid[0]) if invalid.size else rows
+
+    # tolerance of every attempt, including the one that ended the run
+    state.used_tolerance = max(state.used_tolerance, float(used[: nbits + 1].max()))
+    state.decoded += nbits * width
+    # the run ends past the last whole bit, with templates past the end of the signal
+    if nbits == rows and not 0 < max_bits == rows:
+        state.truncated = True
+
+    data = 0
+    if nbits:
+        bits = (is_one[:nbits].astype(np.uint8) + ord("0")).tobytes().decode()
+        data = int(bits[::-1] if lsb else bits, 2)
+
+    if (not expected_bits.has_arg() and nbits != expected_bits.value) or nbits == 0:
+        return (False, data, nbits)
+
+    return (True, data, nbits)
+
+
+# Bulk encoding: args are kept in an object array, so arithmetic on arbitrarily wide
+# values stays exact, and rows are partitioned by the rules they resolve to.
+
+
+def column(value: codecs.ValueOrArg, args: Any) -> Any:
+    """Get a constant or arg reference for each row of args."""
+
+    if value.arg <= 0:
+        return np.full(len(args), value.value, dtype=object)
+    return args[:, value.arg]
+
+
+def eval_op_many(rule: codecs.RuleDef, values: Any) -> Any:
+    """Vectorized version of RuleDef.eval_op."""
+
+    from remoteprotocols.codecs import encoder
+
+    if rule.negate:
+        values = ~values
+    if rule.operation == "/":
+        return np.array([int(value / rule.op_arg) for value in values], dtype=object)
+
+    func = encoder.OPERATORS.get(rule.operation)
+    return values if func is None else func(values, rule.op_arg)
+
+
+def split_rows(values: Any, rows: Any) -> list[tuple[int, Any]]:
+    """Split rows by their value, return (value, rows with that value)."""
+
+    return [(int(value), rows[values == value]) for value in np.unique(values)]
+
+
+def split_rule(
+    rule: codecs.RuleDef, args: Any, rows: Any
+) -> list[tuple[Any, list[tuple[codecs.RuleDef, int]]]]:
+    """Resolve a single rule for rows of args, grouping rows by the result.
+
+    Return the rows of each group and the (rule, number of bits) of each timings and
+    data rule they encode.
+    """
+
+    if rule.type > 0:
+        return [(rows, [(rule, 0)])]
+
+    if rule.type == 0:
+        nbits = column(rule.nbits, args[rows])
+        return [
+            (value_rows, [(rule, value)])
+            for value, value_rows in split_rows(nbits, rows)
+        ]
+
+    groups: list[tuple[Any, list[tuple[codecs.RuleDef, int]]]] = []
+    if rule.type == -1:
+        from remoteprotocols.codecs import encoder
+
+        data = eval_op_many(rule, column(rule.data, args[rows]))
+        compare = encoder.COMPARISONS[rule.action]
+        # comparisons of scalars, applied to whole columns
+        cond = np.asarray(compare(data, column(rule.nbits, args[rows])), dtype=bool)
+
+        for branch, mask in ((rule.consequent, cond), (rule.alternate, ~cond)):
+            if mask.any():
+                groups += partition_rules(branch, args, rows[mask])
+
+    return groups
+
+
+def partition_rules(
+    rules: list[codecs.RuleDef] | None, args: Any, rows: Any
+) -> list[tuple[Any, list[tuple[codecs.RuleDef, int]]]]:
+    """Resolve the conditionals of rules for rows of args, grouping rows by the result.
+
+    Return the rows of each group and the (rule, number of bits) of each timings and
+    data rule they encode.
+    """
+
+    groups: list[tuple[Any, list[tuple[codecs.RuleDef, int]]]] = [(rows, [])]
+
+    for rule in rules or []:
+        groups = [
+            (split, flat + resolved)
+            for group_rows, flat in groups
+            for split, resolved in split_rule(rule, args, group_rows)
+        ]
+
+    return groups
+
+
+def durations_matrix(
+    durations: list[codecs.ValueOrArg], timings: codecs.TimingsDef, args: Any
+) -> Any:
+    """Get durations for each row of args, as a (rows, durations) int64 matrix."""
+
+    if not timings.unit.has_arg() and not any(d.has_arg() for d in durations):
+        bursts = np.array(
+            [d.value * timings.unit.value for d in durations], dtype=np.int64
+        )
+        return np.broadcast_to(bursts, (len(args), len(durations)))
+
+    unit = column(timings.unit, args)
+    matrix: Any = np.empty((len(args), len(durations)), dtype=np.int64)
+    for idx, duration in enumerate(durations):
+        matrix[:, idx] = (column(duration, args) * unit).astype(np.int64)
+    return matrix
+
+
+def encode_block(
+    rule: codecs.RuleDef, nbits: int, timings: codecs.TimingsDef, args: Any
+) -> Any:
+    """Encode a timings or data rule for rows of args with the same number of bits."""
+
+    if rule.type > 0:
+        index = rule.type - 1
+        durations = timings.slots[index] if index < len(timings.slots) else []
+        return durations_matrix(durations, timings, args)
+
+    if nbits <= 0:
+        return np.zeros((len(args), 0), dtype=np.int64)
+
+    one = durations_matrix(timings.one, timings, args)
+    zero = durations_matrix(timings.zero, timings, args)
+
+    data = eval_op_many(rule, column(rule.data, args)) & ((1 << nbits) - 1)
+    shifts = np.arange(nbits - 1, -1, -1) if rule.action == "M" else np.arange(nbits)
+    if nbits < 64:
+        bits = (data.astype(np.uint64)[:, None] >> shifts.astype(np.uint64)) & 1
+    else:
+        bits = np.stack([(data >> int(shift)) & 1 for shift in shifts], axis=1)
+    bits = bits.astype(bool)
+
+    return np.where(bits[:, :, None], one[:, None, :], zero[:, None, :]).reshape(
+        len(args), -1
+    )
+
+
+def partition_pattern(
+    pattern: codecs.PatternDef, args: Any, rows: Any
+) -> list[tuple[Any, tuple[list[tuple[codecs.RuleDef, int]], ...]]]:
+    """Group rows of args by the rules they resolve to, in each section of a pattern.
+
+    Return the rows of each group and the resolved (pre, frame, post) sections.
+    """
+
+    groups: list[tuple[Any, tuple[list[tuple[codecs.RuleDef, int]], ...]]] = []
+    for pre_rows, pre in partition_rules(pattern.pre, args, rows):
+        frames = partition_rules(pattern.data + (pattern.mid or []), args, pre_rows)
+        for frame_rows, frame in frames:
+            for post_rows, post in partition_rules(pattern.post, args, frame_rows):
+                groups.append((post_rows, (pre, frame, post)))
+
+    return groups
+
+
+def encode_group(
+    timings: codecs.TimingsDef,
+    parts: tuple[list[tuple[codecs.RuleDef, int]], ...],
+    repeat: int,
+    args: Any,
+) -> Any:
+    """Encode rows of args that resolve to the same rules, as a (rows, bursts) matrix."""
+
+    empty: Any = np.zeros((len(args), 0), dtype=np.int64)
+    pre, frame, post = (
+        [empty] + [encode_block(rule, nbits, timings, args) for rule, nbits in part]
+        for part in parts
+    )
+
+    frame_matrix = np.tile(np.concatenate(frame, axis=1), (1, max(repeat, 0)))
+    return np.concatenate(pre + [frame_matrix] + post, axis=1)
+
+
+def encode_rows(
+    protocol: codecs.CodecDef, preset: int, args: Any, rows: Any
+) -> list[tuple[Any, Any]]:
+    """Encode rows of args one by one. Return the (rows, bursts matrix) of each row."""
+
+    encoder = protocol.get_encoder(preset)
+    return [
+        ([row], np.array(encoder(list(args[row])), dtype=np.int64).reshape(1, -1))
+        for row in rows
+    ]
+
+
+def encode_preset(
+    protocol: codecs.CodecDef, preset: int, args: Any, rows: Any
+) -> list[tuple[Any, Any]]:
+    """Encode rows of args with the same timing preset, grouped by repeats and rules.
+
+    Return the (rows, bursts matrix) of each group.
+    """
+
+    timings = protocol.timings[preset]
+    if len(timings.one) != len(timings.zero):
+        # bits of different length can't be expanded at once, encode row by row
+        return encode_rows(protocol, preset, args, rows)
+
+    pattern = protocol.pattern
+    repeat_value = codecs.ValueOrArg(1)
+    if pattern.repeat_send is not None:
+        repeat_value = pattern.repeat_send
+    elif pattern.repeat is not None:
+        repeat_value = pattern.repeat
+
+    encoded: list[tuple[Any, Any]] = []
+    for repeat, repeat_rows in split_rows(column(repeat_value, args[rows]), rows):
+        for group_rows, parts in partition_pattern(pattern, args, repeat_rows):
+            group = encode_group(timings, parts, repeat, args[group_rows])
+            encoded.append((group_rows, group))
+
+    return encoded
+
+
+def encode_many(
+    protocol: codecs.CodecDef, args_matrix: Any, toggle: int = 0
+) -> tuple[Any, Any]:
+    """Vectorized version of CodecDef.encode for many rows of args.
+
+    Rows are grouped by timing preset, repeats and the rules they resolve to (the taken
+    branch of conditionals and the number of bits of data rules), and each group is
+    encoded at once. Return an int32 matrix of bursts, padded with zeros, and the
+    number of bursts of each row.
+    """
+
+    matrix = np.array(args_matrix, dtype=object)
+    args: Any = np.empty((len(matrix), len(protocol.args) + 1), dtype=object)
+    args[:, 0] = toggle
+    args[:, 1:] = matrix.reshape(len(matrix), len(protocol.args))
+
+    encoded: list[tuple[Any, Any]] = []
+    presets = split_rows(column(protocol.preset, args), np.arange(len(args)))
+    for preset, preset_rows in presets:
+        if preset >= len(protocol.timings):
+            # nothing to encode
+            continue
+        encoded += encode_preset(protocol, preset, args, preset_rows)
+
+    lengths: Any = np.zeros(len(args), dtype=np.int64)
+    width = max((group.shape[1] for _, group in encoded), default=0)
+    bursts = np.zeros((len(args), width), dtype=np.int32)
+
+    info = np.iinfo(np.int32)
+    for rows, group in encoded:
+        if group.size and (group.max() > info.max or group.min() < info.min):
+            raise vol.Invalid("Durations must fit in signed 32-bit integers")
+        bursts[rows, : group.shape[1]] = group
+        lengths[rows] = group.shape[1]
+
+    return (bursts, lengths)
@@ -0,0 +1,75 @@
+"""Bounded in-memory cache, to memoize parsed and encoded commands."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from remoteprotocols.protocol import slots_repr
+
+
+class LRUCache:
+    """Mapping of at most 'maxsize' entries, discarding the least recently used.
+
+    Counts hits and misses of lookups. Safe to use from several threads.
+    """
+
+    __slots__ = ("maxsize", "hits", "misses", "entries", "lock")
+
+    maxsize: int
+    hits: int
+    misses: int
+    entries: OrderedDict[Hashable, Any]
+    lock: threading.Lock
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return slots_repr(self)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        """Get a cached value, None if not cached."""
+
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Cache a value, discarding the least recently used one if full."""
+
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Discard all cached values, keeping the counters."""
+
+        with self.lock:
+            self.entries.clear()
+
+    def info(self) -> dict[(str, int)]:
+        """Get the counters and size of the cache."""
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+        }
@@ -2,7 +2,20 @@
 
 from __future__ import annotations
 
-from typing import Any
+import math
+from array import array
+from typing import Any, Callable, Sequence
+
+import voluptuous as vol  # type: ignore
+
+BURSTS_TYPECODE = "i"  # signed 32-bit durations
+
+
+def slots_repr(obj: Any) -> str:
+    """Represent a slotted object as the dict of its assigned attributes."""
+    return {
+        name: getattr(obj, name) for name in obj.__slots__ if hasattr(obj, name)
+    }.__str__()
 
 
 class ArgDef:
@@ -17,6 +30,8 @@ class ArgDef:
     min: int = 0
     max: int
     values: list[int] | None = None
+    # Validator of the values of the argument, built once on first use (not pickled)
+    validator: Callable[[Any], int] | None = None
 
     def __init__(self, value: dict[(str, Any)]) -> None:
         self.values = []
@@ -26,29 +41,173 @@ class ArgDef:
     def __repr__(self) -> str:
         return self.__dict__.__str__()
 
+    def __getstate__(self) -> dict[(str, Any)]:
+        state = self.__dict__.copy()
+        state.pop("validator", None)
+        return state
+
+
+def format_signature(name: str, args: list[ArgDef]) -> str:
+    """Format the signature of a protocol to use to send a command."""
+
+    signature = [name]
+
+    for arg in args:
+        if arg.default is not None:
+            signature.append(f"<{arg.name}?={arg.default}>")
+        else:
+            signature.append(f"<{arg.name}>")
+
+    return ":".join(signature)
+
+
+def new_bursts(values: Any) -> array[int]:  # pylint: disable=unsubscriptable-object
+    """Copy durations into array('i'), rejecting those out of signed 32-bit range."""
+
+    try:
+        return array(BURSTS_TYPECODE, values)
+    except OverflowError:
+        raise vol.Invalid("Durations must fit in signed 32-bit integers")
+
+
+def to_bursts(value: Any) -> Sequence[int]:
+    """Get durations as a buffer of signed 32-bit integers, without copying if possible.
+
+    Accepts array('i'), NumPy int32 arrays or raw bytes (native byte order) without copying.
+    Any other sequence of integers is converted into array('i').
+    """
+
+    if isinstance(value, array) and value.typecode == BURSTS_TYPECODE:
+        return value
+
+    try:
+        view = memoryview(value)
+    except TypeError:
+        return new_bursts(value)
+
+    fmt = str(view.format)
+    if view.ndim == 1 and view.c_contiguous:
+        if fmt == BURSTS_TYPECODE:
+            return view
+        if view.itemsize == 4 and fmt.lstrip("@=") in ("i", "l"):
+            return view.cast("B").cast(BURSTS_TYPECODE)
+        if fmt in ("B", "b", "c") and view.nbytes % 4 == 0:
+            return view.cast(BURSTS_TYPECODE)
+
+    return new_bursts(view.tolist())
+
 
 class SignalData:
-    """Raw burst information as durations."""
+    """Raw burst information as durations.
+
+    Bursts are kept as a buffer of signed 32-bit integers (see to_bursts).
+    """
+
+    __slots__ = ("frequency", "_bursts")
+
+    frequency: int
+    _bursts: Sequence[int]
 
-    frequency: int = 0
-    bursts: list[int]
+    def __init__(self, bursts: Any = None, frequency: int = 0) -> None:
+        self.bursts = bursts if bursts is not None else array(BURSTS_TYPECODE)
+        self.frequency = frequency
 
     def __repr__(self) -> str:
-        return self.__dict__.__str__()
+        return {"frequency": self.frequency, "bursts": self._bursts.tolist()}.__str__()  # type: ignore
+
+    @property
+    def bursts(self) -> Sequence[int]:
+        """Burst durations, positive for high and negative for low."""
+        return self._bursts
+
+    @bursts.setter
+    def bursts(self, value: Any) -> None:
+        self._bursts = to_bursts(value)
+
+    def match_bursts(self, start: int, bursts: Sequence[int], tolerance: float) -> bool:
+        """Check if the signal has the expected bursts at position 'start', within tolerance."""
+
+        if len(bursts) > len(self.bursts) - start:
+            return False
+
+        for idx, burst in enumerate(bursts):
+            expect = self.bursts[start + idx]
+            tol = tolerance if expect >= 0 else -tolerance
+
+            if not expect * (1 - tol) <= burst <= expect * (1 + tol):
+                return False
+
+        return True
+
+
+class ToggleContext:
+    """Toggle bit of each protocol, for a caller encoding successive commands.
+
+    Protocols with a toggle bit (like RC5) flip it on every new command sent.
+    """
+
+    __slots__ = ("toggles",)
+
+    toggles: dict[(str, int)]
+
+    def __init__(self) -> None:
+        self.toggles = {}
+
+    def __repr__(self) -> str:
+        return slots_repr(self)
+
+    def next(self, name: str) -> int:
+        """Flip the toggle bit of a protocol and return it."""
+
+        toggle = self.toggles.get(name, 0) ^ 1
+        self.toggles[name] = toggle
+        return toggle
+
+
+def get_toggle(name: str, toggle: int | ToggleContext) -> int:
+    """Get the toggle bit to encode a protocol, from an explicit value or a context."""
+
+    if isinstance(toggle, ToggleContext):
+        return toggle.next(name)
+    return toggle
 
 
 class DecodeMatch:
     """Single decoding match, with args and un-decoded masks."""
 
+    __slots__ = (
+        "protocol",
+        "args",
+        "missing_bits",
+        "uniquematch",
+        "toggle_bit",
+        "tolerance",
+        "max_tolerance",
+        "deviations",
+    )
+
     protocol: ProtocolDef
     args: list[int]
     missing_bits: list[int]
-    uniquematch: bool = True
+    uniquematch: bool
     toggle_bit: int
-    tolerance: float = 0
+    tolerance: float
+    # Matched below this tolerance (exclusive), inf if up to the highest one decoded
+    max_tolerance: float
+    # Highest deviation of each timing slot and data bits, only if decoded with a trace
+    deviations: dict[(str, float)]
+
+    def __init__(self) -> None:
+        self.args = []
+        self.missing_bits = []
+        self.uniquematch = True
+        self.toggle_bit = 0
+        self.tolerance = 0
+        self.max_tolerance = math.inf
+        self.deviations = {}
 
     def __repr__(self) -> str:
-        return self.__dict__.__str__()
+        return slots_repr(self)
 
 
 class ProtocolDef:
@@ -67,16 +226,7 @@ class ProtocolDef:
 
     def get_signature(self) -> str:
         """Get help string with the signature to use to send a command."""
-
-        signature = [self.name]
-
-        for arg in self.args:
-            if arg.default is not None:
-                signature.append(f"<{arg.name}?={arg.default}>")
-            else:
-                signature.append(f"<{arg.name}>")
-
-        return ":".join(signature)
+        return format_signature(self.name, self.args)
 
     def parse_args(self, args: list[str]) -> list[int]:
         """Validate arg list as strings, and converts it to final list of numbers to use in protocol."""
@@ -84,12 +234,36 @@ class ProtocolDef:
     def to_command(self, args: list[int]) -> str:
         """Convert list of arguments as a command string."""
 
-    def encode(self, args: list[int]) -> SignalData:
-        """Encode arguments into a raw signal."""
+    def encode(self, args: list[int], toggle: int | ToggleContext = 0) -> SignalData:
+        """Encode arguments into a raw signal, with a toggle bit or the next one of a context."""
 
     def decode(self, signal: SignalData, tolerance: float = 0.25) -> list[DecodeMatch]:
         """Decode signal into protocol arguments. Empty list if no match."""
 
+    def signal_args(self, signal: SignalData) -> list[int] | None:
+        """Convert a signal into the arguments of a raw format, without matching.
+
+        None if the signal cannot be represented. Only implemented by raw formats.
+        """
+
+    def parse_bytes(self, packet: bytes, frequency: int = 0) -> list[int]:
+        """Convert a packet, as sent to or learnt from the device, to the list of arguments.
+
+        Only implemented by raw formats of devices (broadlink and miio).
+        """
+
+    def to_bytes(self, args: list[int]) -> bytes:
+        """Convert list of arguments to a packet, to send to the device.
+
+        Only implemented by raw formats of devices (broadlink and miio).
+        """
+
+    def get_leading_bursts(self) -> list[tuple[int, ...]] | None:
+        """Get the bursts any decodable signal must start with (one entry per timing preset).
+
+        None if the protocol has no fixed leading timings and must always be tried.
+        """
+
 
 class RemoteCommand:
     """Class to hold a parsed command."""
@@ -101,3 +275,13 @@ class RemoteCommand:
 
     def __repr__(self) -> str:
         return self.command
+
+    def copy(self) -> RemoteCommand:
+        """Get a copy of the command, with its own list of args."""
+
+        cmd = RemoteCommand()
+        cmd.name = self.name
+        cmd.args = list(self.args)
+        cmd.command = self.command
+        cmd.protocol = self.protocol
+        return cmd
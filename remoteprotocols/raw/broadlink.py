@@ -3,16 +3,114 @@
 from __future__ import annotations
 
 import base64
-from typing import Any
+from array import array
+from typing import Any, Sequence
 
 import voluptuous as vol  # type: ignore
 
 from remoteprotocols import validators as val
-from remoteprotocols.protocol import ArgDef, DecodeMatch, ProtocolDef, SignalData
+from remoteprotocols.protocol import (
+    BURSTS_TYPECODE,
+    ArgDef,
+    DecodeMatch,
+    ProtocolDef,
+    SignalData,
+    ToggleContext,
+)
 
 # protocol definition credit to:
 # https://github.com/mjg59/python-broadlink/blob/master/protocol.md
 
+# Shorter signals are faster to pack without NumPy, which is only imported for longer ones
+NUMPY_MIN_PULSES = 128
+
+# Duration in us of each single byte pulse, in ticks of 269/8192 us
+SHORT_PULSES = tuple(int(tick * 8192 / 269 + 0.5) for tick in range(256))
+
+
+def unpack_pulses(data: bytes) -> list[int]:
+    """Convert pulses data (without header) to durations in us.
+
+    Pulses are a single byte of ticks, or 0x00 followed by 2 bytes big endian. The last
+    2 bytes are the termination and not converted. Runs of single byte pulses are
+    converted as a whole, only long pulses are read one by one.
+    """
+
+    end = max(len(data) - 2, 0)
+    result: list[int] = []
+
+    idx = 0
+    while idx < end:
+        escape = data.find(b"\x00", idx, end)
+        if escape < 0:
+            escape = end
+
+        result += [SHORT_PULSES[tick] for tick in data[idx:escape]]
+
+        if escape < end:
+            pulse = (data[escape + 1] << 8) + data[escape + 2]
+            result.append(int(pulse * 8192 / 269 + 0.5))
+        idx = escape + 3
+
+    return result
+
+
+def pack_pulses_numpy(durations: Sequence[int]) -> bytes | None:
+    """NumPy version of pack_pulses, scaling and placing all pulses at once.
+
+    None if NumPy is not installed.
+    """
+
+    try:
+        import numpy as np
+    except ImportError:  # pragma: no cover
+        return None
+
+    ticks = (np.abs(np.asarray(durations, dtype=np.int64)) * 269 / 8192 + 0.5).astype(
+        np.int64
+    )
+    if ticks.size and ticks.max() > 0xFFFF:
+        raise vol.Invalid("Pulse too long for broadlink format")
+
+    is_long = ticks > 0xFF
+    sizes = np.where(is_long, 3, 1)
+    offsets = np.cumsum(sizes) - sizes
+
+    data = np.zeros(int(sizes.sum()), dtype=np.uint8)
+    data[offsets[~is_long]] = ticks[~is_long]
+    data[offsets[is_long] + 1] = ticks[is_long] >> 8
+    data[offsets[is_long] + 2] = ticks[is_long] & 0xFF
+
+    packed: bytes = data.tobytes()
+    return packed
+
+
+def pack_pulses(durations: Sequence[int]) -> bytes:
+    """Convert durations in us (sign is ignored) to pulses data, without header nor termination.
+
+    Pulses of more than 0xFF ticks use the long form: 0x00 followed by 2 bytes big endian.
+    Uses NumPy if installed, for long signals.
+    """
+
+    if len(durations) >= NUMPY_MIN_PULSES:
+        packed = pack_pulses_numpy(durations)
+        if packed is not None:
+            return packed
+
+    ticks = [int(abs(duration) * 269 / 8192 + 0.5) for duration in durations]
+    if ticks and max(ticks) > 0xFFFF:
+        raise vol.Invalid("Pulse too long for broadlink format")
+
+    data = bytearray()
+    start = 0
+    for idx in [idx for idx, tick in enumerate(ticks) if tick > 0xFF]:
+        data += bytes(ticks[start:idx])
+        data += bytes((0, ticks[idx] >> 8, ticks[idx] & 0xFF))
+        start = idx + 1
+    data += bytes(ticks[start:])
+
+    return bytes(data)
+
 
 class BroadlinkFormat(ProtocolDef):
     """Broadlink b64 raw format implementation."""
@@ -33,75 +131,34 @@ class BroadlinkFormat(ProtocolDef):
 
         frequency: int = val.integer(args[1]) if len(args) == 2 else 0
 
-        b64 = base64.b64decode(args[0])
-        result: list[int] = []
+        return self.parse_bytes(base64.b64decode(args[0]), frequency)
+
+    def parse_bytes(self, packet: bytes, frequency: int = 0) -> list[int]:
+        """Convert a broadlink packet, as sent to or learnt from the device, to the list of arguments."""
+
+        packet = bytes(packet)
 
-        if b64[0] not in (0xB2, 0xD7, 0x26):
+        if packet[0] not in (0xB2, 0xD7, 0x26):
             raise vol.Invalid("Invalid signal type")
 
         # check length
-        if len(b64) < 4:
+        if len(packet) < 4:
             raise vol.Invalid("No header data")
 
-        raw_len = b64[2] + (b64[3] >> 8) + 4 + 2
+        raw_len = packet[2] + (packet[3] << 8) + 4 + 2
 
-        if len(b64) != raw_len:
-            print("inconsistent length")
-            # raise vol.Invalid("Inconsistent data length")
+        if len(packet) != raw_len:
+            raise vol.Invalid("Inconsistent data length")
 
-        # Arg1: signal type
-        result.append(b64[0])
-
-        # Arg2: repeats
-        result.append(b64[1])
-
-        # Arg3... signal
-        data = b64[4:]
-        idx = 0
-        while idx < len(data) - 2:
-
-            if data[idx] == 0x0:  # two bytes data
-                pulse = (data[idx + 1] << 8) + data[idx + 2]
-                idx += 3
-            else:
-                pulse = data[idx]
-                idx += 1
-
-            result.append(int(pulse * 8192 / 269 + 0.5))
-
-        # Arg N frequency
-        result.append(frequency)
-
-        return result
+        # Arg1: signal type, Arg2: repeats, Arg3... signal, Arg N frequency
+        return [packet[0], packet[1]] + unpack_pulses(packet[4:]) + [frequency]
 
     def to_command(self, args: list[int]) -> str:
         """Convert list of arguments as a command string."""
 
         command = "broadlink:"
 
-        header: bytearray = bytearray()
-
-        # Type
-        header.append(args[0])
-        # Repeat
-        header.append(args[1])
-
-        data: bytearray = bytearray()
-
-        for pulse in args[2:-1]:
-            pulse = int(abs(pulse) * 269 / 8192 + 0.5)
-            if pulse > 0xFF:
-                data += bytearray([0, pulse >> 8, pulse & 0xFF])
-            else:
-                data += bytearray([pulse])
-
-        # Length in Little endian
-        header += bytearray([len(data) & 0xFF, len(data) >> 8])
-
-        # TODO data termination??
-        data += bytearray([0, 0])
-
-        b64 = base64.b64encode(header + data)
+        b64 = base64.b64encode(self.to_bytes(args))
 
         command += b64.decode("UTF-8")
         if args[-1]:
@@ -109,7 +166,18 @@ class BroadlinkFormat(ProtocolDef):
 
         return command
 
-    def encode(self, args: list[int]) -> SignalData:
+    def to_bytes(self, args: list[int]) -> bytes:
+        """Convert list of arguments to a broadlink packet, to send to the device."""
+
+        data = pack_pulses(args[2:-1])
+
+        # Type, Repeat, Length in Little endian
+        header = bytes([args[0], args[1], len(data) & 0xFF, len(data) >> 8])
+
+        # TODO data termination??
+        return header + data + b"\x00\x00"
+
+    def encode(self, args: list[int], _toggle: int | ToggleContext = 0) -> SignalData:
         """Encode arguments into a raw signal."""
 
         result = SignalData()
@@ -121,34 +189,41 @@ class BroadlinkFormat(ProtocolDef):
         else:
             result.frequency = args[-1]
 
-        result.bursts = []
-        sign = 1
-        for burst in args[2:-1]:
-            result.bursts.append(burst * sign)
-            sign *= -1
+        bursts = array(BURSTS_TYPECODE, args[2:-1])
+        # odd bursts are low
+        bursts[1::2] = array(BURSTS_TYPECODE, [-burst for burst in bursts[1::2]])
 
         # Repeat
         if args[1]:
-            result.bursts *= 1 + args[1]
+            bursts *= 1 + args[1]
 
+        result.bursts = bursts
         return result
 
     def decode(self, signal: SignalData, _tolerance: float = 0.25) -> list[DecodeMatch]:
         """Decode signal into protocol arguments. Empty list if no match."""
 
+        args = self.signal_args(signal)
+        if args is None:
+            return []
+
         match = DecodeMatch()
         match.protocol = self
+        match.args = args
+
+        return [match]
+
+    def signal_args(self, signal: SignalData) -> list[int] | None:
+        """Convert a signal into arguments, None if it cannot be represented."""
 
         if signal.frequency < 10**6:  # Khz range --> assume IR
-            match.args = [0x26, 0]
+            args = [0x26, 0]
         elif signal.frequency < 370e06:  # assume 315Mhz RF
-            match.args = [0xD7, 0]
+            args = [0xD7, 0]
         else:  # 433Mhz RF
-            match.args = [0xB2, 0]
-
-        for burst in signal.bursts:
-            match.args.append(abs(burst))
+            args = [0xB2, 0]
 
-        match.args.append(signal.frequency)
+        args += [abs(burst) for burst in signal.bursts]
+        args.append(signal.frequency)
 
-        return [match]
+        return args
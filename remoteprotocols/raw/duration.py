@@ -7,7 +7,33 @@ from typing import Any
 import voluptuous as vol  # type: ignore
 
 from remoteprotocols import validators as val
-from remoteprotocols.protocol import ArgDef, DecodeMatch, ProtocolDef, SignalData
+from remoteprotocols.protocol import (
+    ArgDef,
+    DecodeMatch,
+    ProtocolDef,
+    SignalData,
+    ToggleContext,
+)
+
+# Validation of each duration, reporting the index of the first invalid one
+DURATIONS_SCHEMA = vol.Schema([vol.All(vol.Length(min=1), val.integer)])
+
+
+def parse_durations(durations: list[str]) -> list[int]:
+    """Convert durations to numbers, checking they alternate signs.
+
+    Plain decimal durations are converted in bulk, others (and errors) by DURATIONS_SCHEMA.
+    """
+
+    try:
+        data = [int(duration) for duration in durations]
+    except ValueError:
+        data = DURATIONS_SCHEMA(durations)
+
+    if any(prev * item > 0 for prev, item in zip(data, data[1:])):
+        val.alternating_signs(data)
+
+    return data
 
 
 class DurationFormat(ProtocolDef):
@@ -27,9 +53,7 @@ class DurationFormat(ProtocolDef):
 
         vol.Length(min=1, max=2)(args)
 
-        data = vol.Schema(
-            [vol.All(vol.Length(min=1), val.integer, val.alternating_signs)]
-        )(val.quoted_split(args[0], ","))
+        data = parse_durations(val.quoted_split(args[0], ","))
 
         frequency: int = val.integer(args[1]) if len(args) == 2 else 0
         data.append(frequency)
@@ -49,23 +73,28 @@ class DurationFormat(ProtocolDef):
 
         return command
 
-    def encode(self, args: list[int]) -> SignalData:
+    def encode(self, args: list[int], _toggle: int | ToggleContext = 0) -> SignalData:
         """Encode arguments into a raw signal."""
 
-        result = SignalData()
-
-        result.frequency = args[-1]
-        result.bursts = args[:-1]
-
-        return result
+        return SignalData(args[:-1], args[-1])
 
     def decode(self, signal: SignalData, _tolerance: float = 0.25) -> list[DecodeMatch]:
         """Decode signal into protocol arguments. Empty list if no match."""
 
+        args = self.signal_args(signal)
+        if args is None:
+            return []
+
         match = DecodeMatch()
         match.protocol = self
-        match.args = signal.bursts.copy()
-
-        match.args.append(signal.frequency)
+        match.args = args
 
         return [match]
+
+    def signal_args(self, signal: SignalData) -> list[int] | None:
+        """Convert a signal into arguments, None if it cannot be represented."""
+
+        args = list(signal.bursts)
+        args.append(signal.frequency)
+
+        return args
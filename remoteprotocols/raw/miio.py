@@ -3,12 +3,21 @@
 from __future__ import annotations
 
 import base64
+import struct
+from array import array
 from typing import Any
 
 import voluptuous as vol  # type: ignore
 
 from remoteprotocols import validators as val
-from remoteprotocols.protocol import ArgDef, DecodeMatch, ProtocolDef, SignalData
+from remoteprotocols.protocol import (
+    BURSTS_TYPECODE,
+    ArgDef,
+    DecodeMatch,
+    ProtocolDef,
+    SignalData,
+    ToggleContext,
+)
 
 # protocol definition credit to:
 # https://github.com/rytilahti/python-miio/blob/master/miio/chuangmi_ir.py
@@ -21,6 +30,10 @@ from remoteprotocols.protocol import ArgDef, DecodeMatch, ProtocolDef, SignalDat
 HEADER1 = 0xA5
 HEADER2 = 0x67
 
+# Tables to split each edge pair byte into its times indexes
+LOW_NIBBLE = bytes(byte & 0xF for byte in range(256))
+HIGH_NIBBLE = bytes(byte >> 4 for byte in range(256))
+
 
 class MiioFormat(ProtocolDef):
     """Miio b64 raw format implementation."""
@@ -41,98 +54,114 @@ class MiioFormat(ProtocolDef):
 
         frequency: int = val.integer(args[1]) if len(args) == 2 else 0
 
-        b64 = base64.b64decode(args[0])
-        result: list[int] = []
+        return self.parse_bytes(base64.b64decode(args[0]), frequency)
+
+    def parse_bytes(self, packet: bytes, frequency: int = 0) -> list[int]:
+        """Convert a miio packet, as sent to or learnt from the device, to the list of arguments."""
+
+        packet = bytes(packet)
 
         # check length
-        if len(b64) < 6:
+        if len(packet) < 6:
             raise vol.Invalid("No header data")
 
-        if b64[0] != HEADER1 or b64[1] != HEADER2:
+        if packet[0] != HEADER1 or packet[1] != HEADER2:
             raise vol.Invalid("Invalid data header")
 
-        pairs = int((b64[2] * 256 + b64[3] + 1) / 2)
-        data = b64[-pairs:]  # 1 par per bytes
+        pairs = int((packet[2] * 256 + packet[3] + 1) / 2)
+        data = packet[-pairs:]  # 1 par per bytes
 
-        times = []
-        for idx in range(4, len(b64) - pairs + 1, 2):
-            times.append((b64[idx] << 8) + b64[idx + 1])
+        count = len(range(4, len(packet) - pairs + 1, 2))
+        if len(packet) < 4 + 2 * count:
+            raise vol.Invalid("Inconsistent data length")
+        times = struct.unpack(f">{count}H", packet[4 : 4 + 2 * count])
 
-        for byte in data:
-            result.append(times[byte & 0xF])
-            result.append(times[byte >> 4])
+        # each byte is a pair of indexes in times, low nibble first
+        indexes = bytearray(2 * len(data))
+        indexes[0::2] = data.translate(LOW_NIBBLE)
+        indexes[1::2] = data.translate(HIGH_NIBBLE)
 
         # Arg N frequency
-        result.append(frequency)
-
-        return result
+        return [times[idx] for idx in indexes] + [frequency]
 
     def to_command(self, args: list[int]) -> str:
         """Convert list of arguments as a command string."""
 
         command = "miio:"
 
-        edges = len(args[:-1]) - 1
-        data: bytearray = bytearray([HEADER1, HEADER2, edges >> 8, edges & 0xFF])
+        b64 = base64.b64encode(self.to_bytes(args))
+        command += b64.decode("UTF-8")
+
+        if args[-1]:
+            command += f":{args[-1]}"
+
+        return command
+
+    def to_bytes(self, args: list[int]) -> bytes:
+        """Convert list of arguments to a miio packet, to send to the device."""
 
-        times: set[int] = set()
-        for burst in args[:-1]:
-            times.add(burst)
-        times_sorted = sorted(times)
-        for time in times_sorted:
-            data += bytearray([(time >> 8), (time & 0xFF)])
+        bursts = args[:-1]
+        edges = len(bursts) - 1
+        header = bytes([HEADER1, HEADER2, edges >> 8, edges & 0xFF])
 
+        times_sorted = sorted(set(bursts))
         if len(times_sorted) > 0xF:
             raise vol.Invalid("Too many different pulse lengths in signal")
 
         times_map = {t: idx for idx, t in enumerate(times_sorted)}
-        for idx in range(0, len(args[:-2]), 2):
-            data += bytearray([times_map[args[idx]] + (times_map[args[idx + 1]] << 4)])
+        indexes = bytes(map(times_map.__getitem__, bursts[: len(bursts) // 2 * 2]))
 
-        b64 = base64.b64encode(data)
-        command += b64.decode("UTF-8")
-
-        if args[-1]:
-            command += f":{args[-1]}"
+        # indexes are below 16, so adding the high ones shifted as a big number
+        # packs each pair of nibbles into one byte, without overlapping
+        low = int.from_bytes(indexes[0::2], "big")
+        high = int.from_bytes(indexes[1::2], "big") << 4
+        data = (low + high).to_bytes(len(indexes) // 2, "big")
 
-        return command
+        return header + struct.pack(f">{len(times_sorted)}H", *times_sorted) + data
 
-    def encode(self, args: list[int]) -> SignalData:
+    def encode(self, args: list[int], _toggle: int | ToggleContext = 0) -> SignalData:
         """Encode arguments into a raw signal."""
 
         result = SignalData()
 
         result.frequency = args[-1]
 
-        result.bursts = []
-        sign = 1
-        for pulse in args[:-1]:
-            result.bursts.append(pulse * sign)
-            sign *= -1
+        bursts = array(BURSTS_TYPECODE, args[:-1])
+        # odd bursts are low
+        bursts[1::2] = array(BURSTS_TYPECODE, [-pulse for pulse in bursts[1::2]])
 
+        result.bursts = bursts
         return result
 
     def decode(self, signal: SignalData, _tolerance: float = 0.25) -> list[DecodeMatch]:
         """Decode signal into protocol arguments. Empty list if no match."""
 
+        args = self.signal_args(signal)
+        if args is None:
+            return []
+
         match = DecodeMatch()
         match.protocol = self
-        match.args = []
+        match.args = args
+
+        return [match]
+
+    def signal_args(self, signal: SignalData) -> list[int] | None:
+        """Convert a signal into arguments, None if it cannot be represented."""
 
         if signal.bursts and signal.bursts[0] < 0:
             # cannot encode inverted signals
-            return []
+            return None
 
         # TODO: need to round signal to generate map of max 16 entries??
-        for burst in signal.bursts:
-            match.args.append(round(abs(burst) / 10) * 10)
+        args = [round(abs(burst) / 10) * 10 for burst in signal.bursts]
 
         # must be all pairs
         # if it ends High, add a minimum pause
         # TODO: find a better logic that a double time
         if len(signal.bursts) % 2:
-            match.args.append(round(abs(signal.bursts[-1] / 10)) * 20)
+            args.append(round(abs(signal.bursts[-1] / 10)) * 20)
 
-        match.args.append(signal.frequency)
+        args.append(signal.frequency)
 
-        return [match]
+        return args
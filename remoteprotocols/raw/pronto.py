@@ -2,15 +2,46 @@
 
 from __future__ import annotations
 
+import struct
+from array import array
 from typing import Any
 
 import voluptuous as vol  # type: ignore
 
 from remoteprotocols import validators as val
-from remoteprotocols.protocol import ArgDef, DecodeMatch, ProtocolDef, SignalData
+from remoteprotocols.protocol import (
+    BURSTS_TYPECODE,
+    ArgDef,
+    DecodeMatch,
+    ProtocolDef,
+    SignalData,
+    ToggleContext,
+)
 
 REFERENCE_FREQUENCY = 4145146
 
+# Validation of each word, reporting the index of the first invalid one
+WORDS_SCHEMA = vol.Schema([vol.All(vol.Length(min=4, max=4), val.hex_string)])
+
+
+def parse_words(words: list[str]) -> list[int]:
+    """Convert 4-digit hex words to numbers.
+
+    Valid words are converted in bulk, any error is reported by WORDS_SCHEMA.
+    """
+
+    if all(len(word) == 4 for word in words):
+        try:
+            data = bytes.fromhex("".join(words))
+        except ValueError:
+            data = b""
+
+        # fromhex skips whitespace, so words with it give less bytes
+        if len(data) == 2 * len(words):
+            return list(struct.unpack(f">{len(words)}H", data))
+
+    return WORDS_SCHEMA(words)  # type: ignore
+
 
 class ProntoFormat(ProtocolDef):
     """Pronto raw format implementation."""
@@ -30,10 +61,7 @@ class ProntoFormat(ProtocolDef):
         if len(args) != 1:
             vol.Invalid(f"Expected one argument, got {len(args)}")
 
-        data = val.quoted_split(args[0], " ")
-        data = vol.Schema([vol.All(vol.Length(min=4, max=4), val.hex_string)])(data)
-
-        return data  # type: ignore
+        return parse_words(val.quoted_split(args[0], " "))
 
     def to_command(self, args: list[int]) -> str:
         """Convert list of arguments as a command string."""
@@ -45,7 +73,7 @@ class ProntoFormat(ProtocolDef):
 
         return command.strip()
 
-    def encode(self, args: list[int]) -> SignalData:
+    def encode(self, args: list[int], _toggle: int | ToggleContext = 0) -> SignalData:
         """Encode arguments into a raw signal."""
 
         result = SignalData()
@@ -70,51 +98,62 @@ class ProntoFormat(ProtocolDef):
                 f"Inconsistent length. Expected {4 + intro_pairs *2 + repeat_pairs *2} but got {len(args)}"
             )
 
-        sign = 1
         base = int(10**6 * args[1] / REFERENCE_FREQUENCY + 0.5)
-        for pulse in args[4:]:
-            result.bursts.append(pulse * base * sign)
-            sign *= -1
+        bursts = array(BURSTS_TYPECODE, [pulse * base for pulse in args[4:]])
+        # odd bursts are low
+        bursts[1::2] = array(BURSTS_TYPECODE, [-pulse for pulse in bursts[1::2]])
 
+        result.bursts = bursts
         return result
 
     def decode(self, signal: SignalData, _tolerance: float = 0.25) -> list[DecodeMatch]:
         """Decode signal into protocol arguments. Empty list if no match."""
 
+        args = self.signal_args(signal)
+        if args is None:
+            return []
+
         match = DecodeMatch()
         match.protocol = self
-        match.args = [0, 0, 0, 0]
+        match.args = args
+
+        return [match]
+
+    def signal_args(self, signal: SignalData) -> list[int] | None:
+        """Convert a signal into arguments, None if it cannot be represented."""
+
+        args = [0, 0, 0, 0]
 
         if signal.frequency:
-            match.args[0] = 0
-            match.args[1] = int(REFERENCE_FREQUENCY / signal.frequency + 0.5)
+            args[0] = 0
+            args[1] = int(REFERENCE_FREQUENCY / signal.frequency + 0.5)
         else:
-            match.args[0] = 0x0100
-            match.args[1] = REFERENCE_FREQUENCY  # TODO: check valid value
+            args[0] = 0x0100
+            args[1] = REFERENCE_FREQUENCY  # TODO: check valid value
 
         # cannot separate between intro and repeat, put everything as intro
         # TODO: encode repeat position in signal??
 
         if not signal.bursts:
-            return []
+            return None
 
         sign = 1
-        match.args[2] = int(len(signal.bursts) / 2)
-        match.args[3] = len(signal.bursts) % 2
+        args[2] = int(len(signal.bursts) / 2)
+        args[3] = len(signal.bursts) % 2
 
-        base = int(10**6 * match.args[1] / REFERENCE_FREQUENCY + 0.5)
+        base = int(10**6 * args[1] / REFERENCE_FREQUENCY + 0.5)
 
         for pulse in signal.bursts:
             pulse = pulse * sign
             if pulse < 0:
-                return []
+                return None
 
-            match.args.append(int(pulse / base + 0.5))
+            args.append(int(pulse / base + 0.5))
             sign *= -1
 
         # if it ends High, add a minimum pause
         # TODO: find a better logic that a double time
         if sign < 0:
-            match.args.append(match.args[-1] * 2)
+            args.append(args[-1] * 2)
 
-        return [match]
+        return args
@@ -2,15 +2,32 @@
 
 from __future__ import annotations
 
-import codecs
+import bisect
 import pathlib
-from typing import Any
+import threading
+from array import array
+from collections import Counter
+from typing import Any, Generator, Iterable, Iterator, Sequence
 
 import voluptuous as vol  # type:ignore
-import yaml
 
 import remoteprotocols.validators as val
-from remoteprotocols.protocol import DecodeMatch, ProtocolDef, RemoteCommand, SignalData
+from remoteprotocols import cache
+from remoteprotocols.codecs import CodecDef
+from remoteprotocols.codecs.automaton import Automaton
+from remoteprotocols.codecs.equivalence import EquivalenceMap, copy_match
+from remoteprotocols.lru import LRUCache
+from remoteprotocols.protocol import (
+    BURSTS_TYPECODE,
+    ArgDef,
+    DecodeMatch,
+    ProtocolDef,
+    RemoteCommand,
+    SignalData,
+    ToggleContext,
+    format_signature,
+    get_toggle,
+)
 from remoteprotocols.raw.broadlink import BroadlinkFormat
 from remoteprotocols.raw.duration import DurationFormat
 from remoteprotocols.raw.miio import MiioFormat
@@ -18,17 +35,233 @@ from remoteprotocols.raw.pronto import ProntoFormat
 
 PROTOCOLS_YAML = "codecs/protocols.yaml"
 
+ENGINE_INTERPRETER = "interpreter"
+ENGINE_REGEX = "regex"
+ENGINE_AUTOMATON = "automaton"
 
-class ProtocolRegistry:
+MODE_ALL = "all"
+MODE_FIRST = "first"
+MODE_BEST = "best"
+
+# Low burst (in microseconds) that ends a frame, longer than the gaps inside any frame
+DEFAULT_GAP = 50000
+
+
+def split_frames(bursts: Sequence[int], gap: int) -> list[tuple[int, int]]:
+    """Split a signal at low bursts of at least 'gap' duration, in a single pass.
+
+    Return (start, end) of each frame, the low burst kept as the last of the frame it
+    ends. Frames starting with such a low burst are skipped.
+    """
+
+    size = len(bursts)
+    frames: list[tuple[int, int]] = []
+    frame = 0
+    for idx in range(size + 1):
+        if idx < size and -bursts[idx] < gap:
+            continue
+
+        end = min(idx + 1, size)
+        if frame < end and -bursts[frame] < gap:
+            frames.append((frame, end))
+        frame = end
+
+    return frames
+
+
+def group_headers(
+    headers: dict[(str, list[tuple[int, ...]])], names: list[str]
+) -> dict[(int, dict[(tuple[int, ...], list[str])])]:
+    """Get the protocols by leading bursts, indexed by their first burst."""
+
+    leading: dict[(int, dict[(tuple[int, ...], list[str])])] = {}
+    for name in names:
+        for header in headers.get(name) or []:
+            if header[0]:
+                leading.setdefault(header[0], {}).setdefault(header, []).append(name)
+
+    return leading
+
+
+def match_headers(
+    signal: SignalData,
+    start: int,
+    end: int,
+    leading: dict[(int, dict[(tuple[int, ...], list[str])])],
+    tolerance: float,
+) -> Iterator[tuple[int, list[str]]]:
+    """Find the positions between 'start' and 'end' where leading bursts of protocols match.
+
+    Yield each position with the names of those protocols. The first burst of each
+    position is compared first, to skip most of them quickly.
+    """
+
+    bursts = signal.bursts
+    for position in range(start, end):
+        burst = bursts[position]
+        tol = tolerance if burst >= 0 else -tolerance
+        found: list[str] = []
+        for first, first_headers in leading.items():
+            if not burst * (1 - tol) <= first <= burst * (1 + tol):
+                continue
+            for header, names in first_headers.items():
+                if signal.match_bursts(position, header, tolerance):
+                    found += names
+        if found:
+            yield (position, found)
+
+
+def frame_positions(
+    signal: SignalData,
+    gap: int,
+    names: list[str],
+    leading: dict[(int, dict[(tuple[int, ...], list[str])])],
+    tolerance: float,
+) -> list[tuple[int, int, list[str]]]:
+    """Get (start, end, protocols) of each position of a signal to decode, in order.
+
+    Each frame is decoded from its start into all protocols, and from every other
+    position where leading bursts match only into those protocols.
+    """
+
+    positions: list[tuple[int, int, list[str]]] = []
+    for frame, end in split_frames(signal.bursts, gap):
+        positions.append((frame, end, names))
+
+        for start, found in match_headers(signal, frame + 1, end, leading, tolerance):
+            positions.append((start, end, [name for name in names if name in found]))
+
+    return positions
+
+
+def unmatched_frames(
+    bursts: Sequence[int], gap: int, offsets: list[int]
+) -> list[tuple[int, int]]:
+    """Get (start, end) of each frame without any of the decoded burst 'offsets' (sorted)."""
+
+    frames: list[tuple[int, int]] = []
+    for frame, end in split_frames(bursts, gap):
+        idx = bisect.bisect_left(offsets, frame)
+        if idx == len(offsets) or offsets[idx] >= end:
+            frames.append((frame, end))
+
+    return frames
+
+
+def signal_caches(signal: SignalData, tolerance: float) -> tuple[Any, Any]:
+    """Get the (regex symbols, demodulated bits) caches of a signal, for all protocols."""
+
+    from remoteprotocols.codecs import decoder, regexdecoder
+
+    return (
+        regexdecoder.SymbolCache(signal, tolerance),
+        decoder.DemodulationCache(signal),
+    )
+
+
+def pick_match(
+    matches: Iterable[DecodeMatch], mode: str, target: float
+) -> DecodeMatch | None:
+    """Pick the match of the 'first' or 'best' decode modes, None if there is none.
+
+    Best is the one with lowest tolerance, preferring unique matches. It stops reading
+    matches at a unique one within 'target' tolerance.
+    """
+
+    best: DecodeMatch | None = None
+    for match in matches:
+        if best is None or (not match.uniquematch, match.tolerance) < (
+            not best.uniquematch,
+            best.tolerance,
+        ):
+            best = match
+
+        if mode == MODE_FIRST or (best.uniquematch and best.tolerance <= target):
+            break
+
+    return best
+
+
+def parse_yaml(content: bytes, file: str) -> dict[(str, Any)]:
+    """Parse the protocols definitions of a yaml file, not validated yet."""
+
+    import yaml
+
+    try:
+        # libyaml based loader if available, much faster
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+        data = yaml.load(content.decode("utf-8"), Loader=loader)
+    except yaml.MarkedYAMLError as err:
+        mark = err.problem_mark
+        if mark:
+            raise vol.Invalid(
+                f"Error parsing yaml file {file}[{mark.line + 1}:{mark.column + 1}]: {err.problem}"
+            )
+        raise err
+
+    if not isinstance(data, dict):
+        raise vol.Invalid(f"Expected a dict of protocols, got {data}")
+    return data
+
+
+class ProtocolRegistry:  # pylint: disable=too-many-public-methods
     """Registry to store all available protocols.
 
     Dispatches calls to respective protocol.
     """
 
-    # Use class attribute, to be shared as singleton instance
-    protocols: dict[(str, ProtocolDef)] = {}
+    # Each registry has its own protocols and state, so instances can be used independently
+    protocols: dict[(str, ProtocolDef)]
+    # Leading bursts of each protocol with fixed header/sync timings, to prune decoding
+    headers: dict[(str, list[tuple[int, ...]])]
+    # Regex programs of each encoded protocol (per timing preset), compiled on first use
+    programs: dict[(str, list[Any])]
+    # Combined trie of all encoded protocols for the automaton engine, rebuilt when needed
+    automaton: Automaton
+    # Which protocols can decode signals of others, for convert, rebuilt when needed
+    equivalences: EquivalenceMap
+    # Raw definitions of protocols loaded in lazy mode, validated and built on first use
+    pending: dict[(str, dict[(str, Any)])]
+    # Disk cache key and entry of the file each pending protocol was loaded from
+    sources: dict[(str, tuple[str, dict[(str, Any)]])]
+    # Names of all protocols, built or pending, in registration order
+    names: dict[(str, None)]
+    build_lock: threading.Lock
+    # Toggle bits of the commands encoded by convert
+    toggles: ToggleContext
+    # Number of decoded signals matched by each protocol, to try likely ones first
+    hits: Counter[str]
+    # Parsed commands by command string and encoded signals by (name, args, toggle)
+    commands: LRUCache | None
+    signals: LRUCache | None
+
+    lazy: bool
+
+    def __init__(
+        self, load_builtin: bool = True, lazy: bool = False, cache_size: int = 0
+    ) -> None:
+        """Create the registry, loading built-in protocols.
+
+        In lazy mode, protocols loaded from files are only validated and built when first
+        needed by get_protocol, parse_command or decode.
+        With a 'cache_size', up to that many parsed commands and encoded signals are kept
+        in memory, to reuse when the same commands are parsed and encoded again.
+        """
 
-    def __init__(self, load_builtin: bool = True) -> None:
+        self.protocols = {}
+        self.headers = {}
+        self.programs = {}
+        self.automaton = Automaton()
+        self.equivalences = EquivalenceMap()
+        self.pending = {}
+        self.sources = {}
+        self.names = {}
+        self.build_lock = threading.Lock()
+        self.toggles = ToggleContext()
+        self.hits = Counter()
+        self.commands = LRUCache(cache_size) if cache_size > 0 else None
+        self.signals = LRUCache(cache_size) if cache_size > 0 else None
+        self.lazy = lazy
         if load_builtin:
             path = pathlib.Path(__file__).parent / PROTOCOLS_YAML
             self.load(path.as_posix())
@@ -45,50 +278,199 @@ class ProtocolRegistry:
 
         from remoteprotocols.codecs import schema1
 
-        protocols = schema1.PROTOCOLS_DEF_SCHEMA(definition)
+        self.add_codecs(schema1.PROTOCOLS_DEF_SCHEMA(definition))
+
+    def add_codecs(self, protocols: dict[(str, Any)]) -> None:
+        """Add already validated encoded protocols (CodecDef objects) to the registry."""
+
+        for protocol in protocols.values():
+            self.add_protocol(protocol)
+
+    def add_pending(self, definition: dict[(str, Any)]) -> None:
+        """Add a dict of encoded protocols definitions, to be validated on first use."""
+
+        if not isinstance(definition, dict):
+            raise vol.Invalid(f"Expected a dict of protocols, got {definition}")
+
+        for name, value in definition.items():
+            name = val.valid_name(name)
+            with self.build_lock:
+                self.remove_protocol(name)
+                self.pending[name] = value
+                self.sources.pop(name, None)
+                self.names[name] = None
+
+    def build(self, name: str) -> None:
+        """Validate and build a pending protocol, only once even if called concurrently."""
+
+        from remoteprotocols.codecs import schema1
 
-        self.protocols.update(protocols)
+        with self.build_lock:
+            definition = self.pending.get(name)
+            if definition is None:
+                return
+
+            source = self.sources.get(name)
+            if source is None:
+                # adding the built protocol also removes it from pending
+                self.add_codecs(schema1.PROTOCOLS_DEF_SCHEMA({name: definition}))
+                return
+
+            # protocols of a cached file are stored with it once validated
+            key, entry = source
+            if name not in entry["protocols"]:
+                entry["protocols"].update(
+                    schema1.PROTOCOLS_DEF_SCHEMA({name: definition})
+                )
+                cache.store(key, entry)
+            self.add_protocol(entry["protocols"][name])
 
     def add_protocol(self, protocol: ProtocolDef) -> None:
         """Add a single protocol to the registry."""
+        self.pending.pop(protocol.name, None)
+        self.sources.pop(protocol.name, None)
+        self.names[protocol.name] = None
         self.protocols[protocol.name] = protocol
+        self.programs.pop(protocol.name, None)
+        self.automaton.invalidate()
+        self.equivalences.invalidate()
+        self.clear_cache()
+
+        leading = protocol.get_leading_bursts()
+        if leading is None:
+            self.headers.pop(protocol.name, None)
+        else:
+            self.headers[protocol.name] = leading
+
+    def remove_protocol(self, name: str) -> None:
+        """Remove a built protocol from the registry."""
+        self.protocols.pop(name, None)
+        self.programs.pop(name, None)
+        self.headers.pop(name, None)
+        self.automaton.invalidate()
+        self.equivalences.invalidate()
+        self.clear_cache()
+
+    def clear_cache(self) -> None:
+        """Discard cached commands and signals, as protocols changed."""
+
+        if self.commands is not None:
+            self.commands.clear()
+        if self.signals is not None:
+            self.signals.clear()
+
+    def cache_info(self) -> dict[(str, dict[(str, int)])]:
+        """Get hits, misses and size of the command and signal caches, if enabled."""
+
+        info: dict[(str, dict[(str, int)])] = {}
+        if self.commands is not None:
+            info["commands"] = self.commands.info()
+        if self.signals is not None:
+            info["signals"] = self.signals.info()
+        return info
 
     def load(self, file: str) -> None:
-        """Read a yaml file and adds it to the registry."""
+        """Read a yaml file and adds it to the registry.
+
+        Definitions and validated protocols are cached on disk by file content, to skip
+        parsing and validation on following loads of the same content. In lazy mode,
+        protocols are validated (and cached) on first use.
+        """
 
         path = pathlib.Path(file).resolve()
 
-        try:
-            with codecs.open(path.as_posix(), "r", encoding="utf-8") as f_handle:
-                data = yaml.safe_load(f_handle)
-        except yaml.MarkedYAMLError as err:
-            mark = err.problem_mark
-            if mark:
-                raise vol.Invalid(
-                    f"Error parsing yaml file {file}[{mark.line + 1}:{mark.column + 1}]: {err.problem}"
-                )
-            raise err
+        with open(path, "rb") as f_handle:
+            content = f_handle.read()
+
+        key = cache.content_key(content)
+        entry = cache.load(key)
+        cached = entry is not None
+        if entry is None:
+            entry = {"definitions": parse_yaml(content, file), "protocols": {}}
+
+        definitions = entry["definitions"]
+        if self.lazy:
+            self.add_pending(definitions)
+            for name in definitions:
+                self.sources[name] = (key, entry)
+            if not cached:
+                # stored without protocols, to skip parsing on following loads
+                cache.store(key, entry)
+            return
 
-        self.add_protocols_def(data)
+        from remoteprotocols.codecs import schema1
+
+        # a lazy registry may have cached only some of the protocols
+        missing = {
+            name: value
+            for name, value in definitions.items()
+            if name not in entry["protocols"]
+        }
+        if missing:
+            entry["protocols"].update(schema1.PROTOCOLS_DEF_SCHEMA(missing))
+            cache.store(key, entry)
+        self.add_codecs({name: entry["protocols"][name] for name in definitions})
 
     def get_protocol(self, name: str) -> ProtocolDef | None:
         """Return a protocol by name."""
+
+        if name in self.pending:
+            self.build(name)
         return self.protocols[name] if name in self.protocols else None
 
+    def get_programs(self, protocol: CodecDef) -> list[Any]:
+        """Get the regex programs of an encoded protocol, compiled on first use."""
+
+        from remoteprotocols.codecs import regexdecoder
+
+        programs = self.programs.get(protocol.name)
+        if programs is None:
+            programs = regexdecoder.compile_codec(protocol)
+            self.programs[protocol.name] = programs
+        return programs
+
+    def get_signature(self, name: str) -> str:
+        """Get the signature of a protocol, without building it if pending."""
+
+        definition = self.pending.get(name)
+        if definition is None:
+            proto = self.get_protocol(name)
+            if proto is None:
+                raise vol.Invalid(f"Unknown Protocol '{name}'")
+            return proto.get_signature()
+
+        from remoteprotocols.codecs import schema1
+
+        schema = vol.Schema(
+            {vol.Required("args"): [schema1.ARG_SCHEMA]}, extra=vol.ALLOW_EXTRA
+        )
+        args = schema(definition)["args"]
+        return format_signature(name, [ArgDef(arg) for arg in args])
+
     def list_protocols(self) -> list[str]:
         """List all supported protocols in alphabetical order."""
 
-        protocols = list(self.protocols)
+        protocols = list(self.names)
         protocols.sort()
         return protocols
 
     def parse_command(self, command: str) -> RemoteCommand:
-        """Parse and validates a command string into a RemoteCommand object."""
-        cmd = RemoteCommand()
+        """Parse and validates a command string into a RemoteCommand object.
+
+        If caching is enabled, commands are reused by command string. A new RemoteCommand
+        is returned on every call.
+        """
 
         if not isinstance(command, str):
             raise vol.Invalid(f"Command must be a string, got {command}")
 
+        if self.commands is not None:
+            cached = self.commands.get(command)
+            if cached is not None:
+                return cached.copy()  # type: ignore
+
+        cmd = RemoteCommand()
+
         cmd.command = command
         command_list = val.quoted_split(command, ":")
 
@@ -110,38 +492,424 @@ class ProtocolRegistry:
                 f"Invalid command '{command}'. {err}\nExpected '{cmd.protocol.get_signature()}'"
             )
 
+        if self.commands is not None:
+            self.commands.put(command, cmd.copy())
         return cmd
 
+    def encode(
+        self, command: str | RemoteCommand, toggle: int | ToggleContext = 0
+    ) -> SignalData:
+        """Encode a command (string or parsed) into a raw signal.
+
+        If caching is enabled, signals are reused by (protocol, args, toggle), kept as
+        bytes. A new SignalData, with its own bursts, is returned on every call.
+        """
+
+        cmd = self.parse_command(command) if isinstance(command, str) else command
+        toggle = get_toggle(cmd.protocol.name, toggle)
+
+        if self.signals is None:
+            return cmd.protocol.encode(cmd.args, toggle)
+
+        key = (cmd.protocol.name, tuple(cmd.args), toggle)
+        cached = self.signals.get(key)
+        if cached is None:
+            signal = cmd.protocol.encode(cmd.args, toggle)
+            cached = (memoryview(signal.bursts).tobytes(), signal.frequency)  # type: ignore
+            self.signals.put(key, cached)
+
+        bursts = array(BURSTS_TYPECODE)
+        bursts.frombytes(cached[0])
+        return SignalData(bursts, cached[1])
+
     def decode(
         self,
         signal: SignalData,
         tolerance: float = 0.20,
         protocols: list[str] | None = None,
+        engine: str = ENGINE_INTERPRETER,
+        mode: str = MODE_ALL,
+        target: float = 0.0,
     ) -> list[DecodeMatch]:
         """Decode a signal and return a list of all matching protocols and corresponding decoded arguments.
 
         It decodes into all known protocols or a filtered subset.
+        Encoded protocols are decoded with the selected engine: 'interpreter', 'regex' or
+        'automaton' (all protocols at once).
+        With mode 'first' only the first match is returned, and with mode 'best' the one
+        with lowest tolerance, preferring unique matches. 'best' tries the most likely
+        protocols first, and stops at a unique match within 'target' tolerance. In both
+        modes raw formats are only decoded if named in 'protocols'.
         """
 
-        decoded: list[DecodeMatch] = []
+        vol.In([MODE_ALL, MODE_FIRST, MODE_BEST])(mode)
+
+        matches = self.iter_decode(
+            signal,
+            tolerance,
+            protocols,
+            engine,
+            prior=mode == MODE_BEST,
+            raw=mode == MODE_ALL,
+        )
 
-        for proto in self.protocols.values():
-            if not protocols or protocols.count(proto.name):
-                decoded += proto.decode(signal, tolerance)
+        if mode == MODE_ALL:
+            return list(matches)
+
+        best = pick_match(matches, mode, target)
+        matches.close()
+        return [best] if best is not None else []
+
+    def iter_decode(
+        self,
+        signal: SignalData,
+        tolerance: float = 0.20,
+        protocols: list[str] | None = None,
+        engine: str = ENGINE_INTERPRETER,
+        prior: bool = False,
+        raw: bool = False,
+        trace: bool = False,
+    ) -> Generator[DecodeMatch, None, None]:
+        """Decode a signal lazily, yielding the matches of each protocol as it is decoded.
+
+        Raw formats are only decoded if 'raw' or if named in 'protocols'. With 'prior',
+        protocols with fixed leading timings and that matched more often are tried first.
+        With 'trace', encoded protocols are decoded at every tolerance up to 'tolerance',
+        as in decode_tolerances.
+        """
+
+        vol.In([ENGINE_INTERPRETER, ENGINE_REGEX, ENGINE_AUTOMATON])(engine)
+
+        checked: dict[(tuple[int, ...], bool)] = {}
+        caches = signal_caches(signal, tolerance)
+        combined: dict[(str, list[DecodeMatch])] = {}
+
+        names = self.select(protocols, raw)
+        for name in names:
+            if name in self.pending:
+                self.build(name)
+
+        if prior:
+            names.sort(key=lambda name: (name not in self.headers, -self.hits[name]))
+
+        if trace:
+            engine = ENGINE_INTERPRETER
+
+        if engine == ENGINE_AUTOMATON:
+            if not self.automaton.valid:
+                self.automaton.build(self.protocols)
+            combined = self.automaton.decode(signal, tolerance, names)
+
+        for name in names:
+            if name in combined:
+                decoded = combined[name]
+            elif not self.is_candidate(name, signal, tolerance, checked):
+                continue
+            else:
+                decoded = self.decode_protocol(
+                    self.protocols[name], signal, tolerance, engine, caches, trace
+                )
+
+            if decoded:
+                self.hits[name] += 1
+            yield from decoded
+
+    def decode_protocol(
+        self,
+        proto: ProtocolDef,
+        signal: SignalData,
+        tolerance: float,
+        engine: str,
+        caches: tuple[Any, Any],
+        trace: bool = False,
+    ) -> list[DecodeMatch]:
+        """Decode a signal into a single protocol with the selected engine.
+
+        'caches' are the (regex symbols, demodulated bits) of the signal, shared by all
+        protocols. With 'trace', as in decode_tolerances.
+        """
+
+        from remoteprotocols.codecs import regexdecoder
+
+        symbols, demodulated = caches
+        if not isinstance(proto, CodecDef):
+            return proto.decode(signal, tolerance)
+        if trace:
+            return proto.decode_tolerances(signal, tolerance)
+        if engine == ENGINE_REGEX:
+            return regexdecoder.decode(
+                proto,
+                self.get_programs(proto),
+                signal,
+                tolerance,
+                symbols,
+                demodulated,
+            )
+        return proto.decode_presets(signal, tolerance, demodulated)[0]
+
+    def decode_tolerances(
+        self,
+        signal: SignalData,
+        max_tolerance: float = 0.5,
+        protocols: list[str] | None = None,
+    ) -> list[DecodeMatch]:
+        """Decode a signal at every tolerance up to 'max_tolerance' at once.
+
+        Each match is decoded at tolerances from its 'tolerance' up to (excluding) its
+        'max_tolerance', so decode at any tolerance 't' in that range returns the matches
+        with 'tolerance <= t < max_tolerance'. Matches also have the highest deviation of
+        each timing slot and one/zero bits. Each encoded protocol is decoded again only
+        below tolerances that change its matches. Raw formats are only decoded if named
+        in 'protocols'.
+        """
+
+        return list(
+            self.iter_decode(signal, max_tolerance, protocols, raw=False, trace=True)
+        )
+
+    def select(self, protocols: list[str] | None, raw: bool = True) -> list[str]:
+        """Get the names of all protocols or a filtered subset, in registration order.
+
+        Without filter, raw formats are only included if 'raw'.
+        """
+
+        if protocols:
+            return [name for name in self.names if name in protocols]
+
+        return [
+            name
+            for name in self.names
+            if raw or name in self.pending or self.protocols[name].type != "raw"
+        ]
+
+    def decode_many(
+        self,
+        signals: Iterable[SignalData],
+        tolerance: float = 0.20,
+        protocols: list[str] | None = None,
+        engine: str = ENGINE_INTERPRETER,
+        workers: int | None = None,
+        chunksize: int = 64,
+    ) -> Iterator[list[DecodeMatch]]:
+        """Decode many signals in a pool of 'workers' processes (one per CPU if None).
+
+        Yield the matches of each signal in input order, as soon as they are decoded.
+        Bursts are sent to workers in shared memory, in tasks of 'chunksize' signals.
+        """
+
+        import multiprocessing
+
+        from remoteprotocols import batch
+
+        vol.In([ENGINE_INTERPRETER, ENGINE_REGEX, ENGINE_AUTOMATON])(engine)
+
+        block, tasks = batch.pack_signals(signals)
+        try:
+            with multiprocessing.Pool(
+                workers,
+                batch.init_worker,
+                (
+                    block.name,
+                    self.protocols,
+                    self.pending,
+                    list(self.names),
+                    (tolerance, protocols, engine),
+                ),
+            ) as pool:
+                for matches in pool.imap(batch.decode_task, tasks, chunksize):
+                    yield [batch.create_match(self, match) for match in matches]
+        finally:
+            block.close()
+            block.unlink()
+
+    def decode_all_frames(
+        self,
+        signal: SignalData,
+        tolerance: float = 0.20,
+        protocols: list[str] | None = None,
+        engine: str = ENGINE_INTERPRETER,
+        gap: int = DEFAULT_GAP,
+        raw: bool = False,
+    ) -> list[tuple[int, list[DecodeMatch]]]:
+        """Decode every frame in a long signal, with leading noise or several commands.
+
+        The signal is split at low bursts of at least 'gap' duration, kept as the last burst
+        of the frame they end. Each frame is decoded from its start, and again from every
+        position where the leading bursts of a protocol match, only into those protocols.
+        Raw formats, which match any frame, are only used if requested by name, or with
+        'raw' for the frames no other protocol matched.
+        Return (burst offset, matches) of each decoded position, in order.
+        """
+
+        names = self.select(protocols, raw=False)
+        if not names:
+            return []
+        for name in names:
+            if name in self.pending:
+                self.build(name)
+
+        leading = group_headers(self.headers, names)
+        positions = frame_positions(signal, gap, names, leading, tolerance)
+        decoded = self.decode_positions(signal, positions, tolerance, engine)
+
+        formats = [name for name in self.select(protocols) if name not in names]
+        if raw and formats:
+            offsets = [start for start, _ in decoded]
+            unmatched = unmatched_frames(signal.bursts, gap, offsets)
+            decoded += self.decode_positions(
+                signal,
+                [(start, end, formats) for start, end in unmatched],
+                tolerance,
+                engine,
+            )
+            decoded.sort(key=lambda item: item[0])
 
         return decoded
 
+    def decode_positions(
+        self,
+        signal: SignalData,
+        positions: list[tuple[int, int, list[str]]],
+        tolerance: float,
+        engine: str,
+    ) -> list[tuple[int, list[DecodeMatch]]]:
+        """Decode the (start, end, protocols) positions of a signal, see frame_positions.
+
+        Return (burst offset, matches) of each decoded position, in order.
+        """
+
+        view = memoryview(signal.bursts)  # type: ignore
+
+        decoded: list[tuple[int, list[DecodeMatch]]] = []
+        for start, end, names in positions:
+            matches = self.decode(
+                SignalData(view[start:end], signal.frequency),
+                tolerance,
+                names,
+                engine,
+            )
+            if matches:
+                decoded.append((start, matches))
+
+        return decoded
+
+    def is_candidate(
+        self,
+        name: str,
+        signal: SignalData,
+        tolerance: float,
+        checked: dict[(tuple[int, ...], bool)] | None = None,
+    ) -> bool:
+        """Check if the signal starts with any of the leading bursts of a protocol.
+
+        Protocols without fixed leading timings are always candidates.
+        'checked' caches results of leading bursts shared between protocols.
+        """
+
+        leading = self.headers.get(name)
+        if leading is None:
+            return True
+
+        if checked is None:
+            checked = {}
+
+        for bursts in leading:
+            if bursts not in checked:
+                checked[bursts] = signal.match_bursts(0, bursts, tolerance)
+            if checked[bursts]:
+                return True
+
+        return False
+
     def convert(
         self,
         command: str,
         tolerance: float = 0.20,
         protocols: list[str] | None = None,
+        mode: str = MODE_ALL,
+        target: float = 0.0,
     ) -> list[DecodeMatch]:
-        """Convert a given command into other protocols (all or filtered)."""
+        """Convert a given command into other protocols (all or filtered).
 
-        cmd = self.parse_command(command)
-        signal = cmd.protocol.encode(cmd.args)
+        Protocols that cannot decode signals of the command's protocol are skipped, and
+        aliases get a copy of the matches of the protocol they are identical to.
+        'mode' and 'target' select the matches to return, as in decode.
+        """
 
-        matches = self.decode(signal, tolerance, protocols)
+        cmd = self.parse_command(command)
+        signal = self.encode(cmd, self.toggles)
+
+        equivalences = self.get_equivalences()
+        names = self.select(protocols, mode == MODE_ALL)
+        names = equivalences.candidates(cmd.protocol.name, tolerance, names)
+        if not names:
+            return []
+
+        if mode != MODE_ALL:
+            return self.decode(signal, tolerance, names, mode=mode, target=target)
+
+        # aliases of a protocol also being decoded get a copy of its matches
+        copied = {
+            name: equivalences.aliases[name]
+            for name in names
+            if equivalences.aliases.get(name) in names
+        }
+
+        decoded: dict[(str, list[DecodeMatch])] = {name: [] for name in names}
+        for match in self.decode(
+            signal, tolerance, [name for name in names if name not in copied]
+        ):
+            decoded[match.protocol.name].append(match)
+
+        matches: list[DecodeMatch] = []
+        for name in names:
+            if name in copied:
+                matches += [
+                    copy_match(match, self.protocols[name])
+                    for match in decoded[copied[name]]
+                ]
+            else:
+                matches += decoded[name]
 
         return matches
+
+    def get_equivalences(self) -> EquivalenceMap:
+        """Get the map of protocols that can decode signals of others, built on first use."""
+
+        if not self.equivalences.valid:
+            for name in list(self.pending):
+                self.build(name)
+            self.equivalences.build(self.protocols)
+        return self.equivalences
+
+    def get_raw_format(self, name: str) -> ProtocolDef:
+        """Return a raw format by name."""
+
+        proto = self.get_protocol(name)
+        if proto is None or proto.type != "raw":
+            raise vol.Invalid(f"Unknown raw format '{name}'")
+        return proto
+
+    def encode_as(self, command: str | RemoteCommand, target: str) -> str:
+        """Encode a command and render it as a command of a raw format (broadlink, miio, pronto, duration).
+
+        Unlike convert, the signal is not decoded into other protocols.
+        """
+
+        return self.encode_many_as([command], target)[0]
+
+    def encode_many_as(
+        self, commands: Iterable[str | RemoteCommand], target: str
+    ) -> list[str]:
+        """Encode many commands and render each one as a command of the same raw format."""
+
+        raw_format = self.get_raw_format(target)
+
+        rendered: list[str] = []
+        for command in commands:
+            args = raw_format.signal_args(self.encode(command, self.toggles))
+            if args is None:
+                raise vol.Invalid(f"Command '{command}' cannot be rendered as {target}")
+            rendered.append(raw_format.to_command(args))
+
+        return rendered
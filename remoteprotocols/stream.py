@@ -0,0 +1,200 @@
+"""Incremental decoding of a live stream of bursts, as received."""
+
+from __future__ import annotations
+
+from array import array
+from typing import Iterable, Sequence
+
+from remoteprotocols.codecs import CodecDef, decoder
+from remoteprotocols.protocol import BURSTS_TYPECODE, DecodeMatch, SignalData
+from remoteprotocols.registry import DEFAULT_GAP, ENGINE_INTERPRETER, ProtocolRegistry
+
+
+def match_prefix(
+    bursts: Sequence[int], leading: Sequence[int], tolerance: float
+) -> bool:
+    """Check if the received bursts coincide with the start of the leading bursts, within tolerance."""
+
+    for idx in range(min(len(bursts), len(leading))):
+        expect = bursts[idx]
+        tol = tolerance if expect >= 0 else -tolerance
+
+        if not expect * (1 - tol) <= leading[idx] <= expect * (1 + tol):
+            return False
+
+    return True
+
+
+class StreamDecoder:
+    """Decode bursts incrementally, as they are received.
+
+    Frames are split on a low burst of at least 'gap' duration, which is kept as the last
+    burst of the frame it ends. Protocols with fixed leading timings are dropped as soon as
+    the start of the frame cannot match, and the frame is only decoded into the remaining
+    ones. If none remains the rest of the frame is discarded without buffering.
+    Raw formats, which match any frame, are only decoded if requested by name.
+
+    The frame is also decoded, without waiting for the gap, as soon as it is complete for
+    every remaining protocol: any longer frame would decode the same. The rest of the
+    frame is then discarded.
+    """
+
+    registry: ProtocolRegistry
+    gap: int
+    tolerance: float
+    frequency: int
+    engine: str
+
+    # Leading bursts of each protocol to decode, None if always a candidate
+    headers: dict[(str, list[tuple[int, ...]] | None)]
+    # Length of the longest leading bursts, no more pruning after it
+    header_len: int
+
+    candidates: dict[(str, list[tuple[int, ...]] | None)]
+    frame: array[int]  # pylint: disable=unsubscriptable-object
+
+    def __init__(
+        self,
+        registry: ProtocolRegistry,
+        gap: int = DEFAULT_GAP,
+        tolerance: float = 0.20,
+        protocols: list[str] | None = None,
+        engine: str = ENGINE_INTERPRETER,
+        frequency: int = 0,
+    ) -> None:
+        """Create a decoder for a stream, into all known protocols or a filtered subset."""
+
+        self.registry = registry
+        self.gap = gap
+        self.tolerance = tolerance
+        self.engine = engine
+        self.frequency = frequency
+
+        self.headers = {}
+        for name in registry.select(protocols, raw=False):
+            if name in registry.pending:
+                registry.build(name)
+            self.headers[name] = registry.headers.get(name)
+
+        self.header_len = max(
+            (
+                len(bursts)
+                for leading in self.headers.values()
+                for bursts in leading or []
+            ),
+            default=0,
+        )
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard the frame being received."""
+
+        self.candidates = dict(self.headers)
+        self.frame = array(BURSTS_TYPECODE)
+
+    def feed(self, bursts: Iterable[int]) -> list[DecodeMatch]:
+        """Add received bursts to the stream.
+
+        Return the matches of all the frames completed by these bursts.
+        """
+
+        decoded: list[DecodeMatch] = []
+        start = len(self.frame)
+
+        for burst in bursts:
+            if not self.frame and -burst >= self.gap:
+                # idle time between frames
+                continue
+
+            if self.candidates:
+                self.frame.append(burst)
+            elif not self.frame:
+                # first burst of a discarded frame, keep it as a marker
+                self.frame.append(burst)
+
+            if -burst >= self.gap:
+                self.prune(start)
+                decoded += self.flush()
+                start = 0
+
+        self.prune(start)
+        if self.frame and self.candidates:
+            # a complete frame decodes the same with any bursts received after it
+            decoded += self.complete()
+        return decoded
+
+    def flush(self) -> list[DecodeMatch]:
+        """Decode the frame being received, as complete. Used when the stream ends or times out."""
+
+        decoded: list[DecodeMatch] = []
+        if self.frame and self.candidates:
+            signal = SignalData(self.frame, self.frequency)
+            decoded = self.registry.decode(
+                signal, self.tolerance, list(self.candidates), self.engine
+            )
+
+        self.reset()
+        return decoded
+
+    def complete(self) -> list[DecodeMatch]:
+        """Decode the frame being received if complete for every remaining candidate.
+
+        Then the rest of the frame, up to the gap, is discarded. Empty list otherwise, or
+        if no candidate matches.
+        """
+
+        # decoded from a copy, as the frame keeps growing if not complete
+        signal = SignalData(self.frame[:], self.frequency)
+        cache = decoder.DemodulationCache(signal)
+
+        matched = False
+        for name in self.candidates:
+            protocol = self.registry.protocols[name]
+            if not isinstance(protocol, CodecDef):
+                return []
+            matches, _, complete = protocol.decode_presets(
+                signal, self.tolerance, cache
+            )
+            if not complete:
+                return []
+            matched = matched or bool(matches)
+
+        decoded: list[DecodeMatch] = []
+        if matched:
+            decoded = self.registry.decode(
+                signal, self.tolerance, list(self.candidates), self.engine
+            )
+
+        self.candidates = {}
+        self.frame = self.frame[:1]
+        return decoded
+
+    def prune(self, start: int) -> None:
+        """Drop candidates whose leading bursts cannot match the frame.
+
+        'start' is the length of the frame when last pruned.
+        """
+
+        if start >= self.header_len or not self.candidates:
+            return
+
+        checked: dict[(tuple[int, ...], bool)] = {}
+        for name, leading in list(self.candidates.items()):
+            if leading is None:
+                continue
+
+            remaining: list[tuple[int, ...]] = []
+            for bursts in leading:
+                if bursts not in checked:
+                    checked[bursts] = match_prefix(self.frame, bursts, self.tolerance)
+                if checked[bursts]:
+                    remaining.append(bursts)
+
+            if remaining:
+                self.candidates[name] = remaining
+            else:
+                del self.candidates[name]
+
+        if not self.candidates:
+            # nothing to decode, stop buffering the frame
+            del self.frame[1:]
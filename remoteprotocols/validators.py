@@ -3,12 +3,15 @@
 from __future__ import annotations
 
 import re
-from typing import Any, Callable, cast
+from typing import Any, Callable, Sequence, cast
 
 import voluptuous as vol  # type: ignore
 
 # Validation Helpers
 
+RE_QUOTE = re.compile(r"^\s*([\"\'])((?:(?!\1).|\\\1)*)(?<!\\)\1\s*$")
+RE_HEX = re.compile(r"^[0-9a-fA-F]+$")
+
 BITS_VALUES = {
     "8bits": 0xFF,
     "16bits": 0xFFFF,
@@ -27,10 +30,8 @@ def remove_quotes(value: Any) -> Any:
     In any other case returns the value unchanged
     """
     if isinstance(value, str):
-        # remove quotes
-        re_quote = re.compile(r"^\s*([\"\'])((?:(?!\1).|\\\1)*)(?<!\\)\1\s*$")
         # remove border quotes
-        match = re.search(re_quote, value)
+        match = RE_QUOTE.search(value)
         if match:
             value = match[2]
     return value
@@ -165,7 +166,7 @@ def kebab_to_pascal(value: str) -> str:
     return value
 
 
-def alternating_signs(value: list[str | int]) -> list[str | int]:
+def alternating_signs(value: Sequence[str | int]) -> Sequence[str | int]:
     """Validate that a list has all alternating positive and negatives elements, skiping argument references."""
     assert isinstance(value, list)
     for i in range(1, len(value)):
@@ -197,13 +198,16 @@ def hex_string(value: Any) -> int:
 
     val = coerce_string(value)
 
-    re_hex = re.compile(r"^[0-9a-fA-F]+$")
-    if not re_hex.match(val):
+    if not RE_HEX.match(val):
         raise vol.Invalid("String must be all hexadecimal digits")
 
     return int(val, 16)
 
 
+# Pattern of the first part of a string up to a delimiter, by delimiter
+QUOTED_PARTS: dict[(str, re.Pattern[str])] = {}
+
+
 def quoted_split(text: str, delimiter: str) -> list[str]:
     """Split a string by 'delimiter', ignoring it if it is inside quotations.
 
@@ -211,18 +215,29 @@ def quoted_split(text: str, delimiter: str) -> list[str]:
     Consecutive delimiters are returned as empty string.
     """
 
-    args = []
-    # gets first part
-    re_first = re.compile(
-        r"^(?:\s*([\"\'])(?:(?!\1).|\\\1)*(?<!\\)\1\s*|[^" + delimiter + r"]?)+"
-    )
+    if "'" not in text and '"' not in text:
+        # nothing quoted, same result as the pattern in a single split
+        args = [arg.strip() for arg in text.split(delimiter)]
+        if text.endswith(delimiter) or not text:
+            args.pop()
+        return args
+
+    re_part = QUOTED_PARTS.get(delimiter)
+    if re_part is None:
+        re_part = re.compile(
+            r"(?:\s*([\"\'])(?:(?!\1).|\\\1)*(?<!\\)\1\s*|[^" + delimiter + r"]?)+"
+        )
+        QUOTED_PARTS[delimiter] = re_part
 
-    while len(text):
-        match = re.search(re_first, text)
+    args = []
+    pos = 0
+    # single pass, each part starts after the delimiter that ended the previous one
+    while pos < len(text):
+        match = re_part.match(text, pos)
 
         if not match:
             break
-        text = text[match.end(0) + 1 :]
+        pos = match.end(0) + 1
 
         # remove spaces
         arg = match[0].strip()